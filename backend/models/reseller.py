@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 import uuid
 
@@ -42,6 +42,30 @@ class Reseller(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+    @classmethod
+    def new_document(cls, **data) -> Dict[str, Any]:
+        """
+        Documento de uma nova revenda pronto para o MongoDB, sem passar pela validação
+
+        Para dados já limpos e tipados pelo chamador (ex.: importação em lote): preenche os
+        valores padrão do modelo e aplica `data` por cima.
+        """
+        document = dict(_DOCUMENT_DEFAULTS)
+        for name, factory in _DOCUMENT_FACTORIES.items():
+            document[name] = factory()
+        document.update(data)
+        return document
+
+# Padrões do Reseller calculados uma vez (usados por Reseller.new_document)
+_DOCUMENT_DEFAULTS = {
+    name: field.default for name, field in Reseller.model_fields.items()
+    if not field.is_required() and field.default_factory is None
+}
+_DOCUMENT_FACTORIES = {
+    name: field.default_factory for name, field in Reseller.model_fields.items()
+    if field.default_factory is not None
+}
+
 class ResellerCreate(BaseModel):
     name: str
     cnpj: Optional[str] = None
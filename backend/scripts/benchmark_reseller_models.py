@@ -0,0 +1,124 @@
+"""
+Benchmark do custo por linha na construção de revendas
+
+Compara o caminho validado pelo Pydantic com os caminhos rápidos usados nas rotas em lote:
+    - importação: Reseller(**dados).model_dump()  x  Reseller.new_document(**dados)
+    - busca:      Reseller(**documento) por revenda  x  ResellerService.get_searchable_entries
+                  (documentos no formato devolvido pelo MongoDB com SNAPSHOT_PROJECTION, com _id)
+
+Uso (a partir de backend/):
+    python scripts/benchmark_reseller_models.py [linhas]
+"""
+import sys
+import time
+import asyncio
+from pathlib import Path
+from bson import ObjectId
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models.reseller import Reseller  # noqa: E402
+from services.reseller_snapshot import SNAPSHOT_PROJECTION  # noqa: E402
+from services.reseller_service import ResellerService  # noqa: E402
+
+
+class _ProjectedCollection:
+    """Coleção em memória: find() devolve os documentos já projetados, como o cursor do MongoDB"""
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    def find(self, query=None, projection=None):
+        return _Cursor(self.documents)
+
+
+class _Cursor:
+    def __init__(self, documents):
+        self._documents = iter(documents)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            # O motor entrega um dict novo por documento
+            return dict(next(self._documents))
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class _Database:
+    def __init__(self, documents):
+        self.resellers = _ProjectedCollection(documents)
+
+
+def sample_row(i: int) -> dict:
+    return {
+        'name': f'REVENDA DE GAS {i} LTDA',
+        'cnpj': f'{i:014d}',
+        'address': f'Rua Exemplo, {i}',
+        'neighborhood': 'Centro',
+        'city': 'São Paulo',
+        'state': 'SP',
+        'cep': '01310-100',
+        'phone': '(11) 3333-4444',
+        'whatsapp': '',
+        'hours': 'Segunda a Sábado: 8h às 18h',
+        'active': True,
+        'data_enriched': True,
+        'service_radius_km': 10.0,
+        'priority': 0,
+        'serves_business': True,
+        'serves_residential': True,
+        'preferred_channel': 'phone',
+        'coordinates': {'lat': -23.56, 'lng': -46.65},
+        'geocoding_source': 'normalized_data',
+    }
+
+
+def measure(label: str, func, items) -> float:
+    started = time.perf_counter()
+    for item in items:
+        func(item)
+    per_row_us = (time.perf_counter() - started) / len(items) * 1e6
+    print(f"  {label:<40} {per_row_us:8.2f} µs/linha")
+    return per_row_us
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rows = [sample_row(i) for i in range(total)]
+    # Documentos como gravados no MongoDB (com _id) e como o cursor os devolve com a projeção da busca
+    documents = [{'_id': ObjectId(), **Reseller(**row).model_dump()} for row in rows]
+    projected = [
+        {'_id': doc['_id'], **{field: doc[field] for field in SNAPSHOT_PROJECTION if field in doc}}
+        for doc in documents
+    ]
+
+    print(f"📊 {total} linhas")
+
+    print("Importação (linha limpa -> documento)")
+    before = measure("Reseller(**dados).model_dump()", lambda row: Reseller(**row).model_dump(), rows)
+    after = measure("Reseller.new_document(**dados)", lambda row: Reseller.new_document(**row), rows)
+    print(f"  ganho: {before / after:.1f}x")
+
+    print("Busca por varredura (documento do Mongo -> entrada com lat/lng)")
+
+    def validated(doc):
+        reseller = Reseller(**doc)
+        return reseller.coordinates.lat, reseller.coordinates.lng
+
+    before = measure("Reseller(**documento)", validated, documents)
+
+    # Caminho de produção: cursor projetado + entry_from_document, por get_searchable_entries
+    service = ResellerService(_Database(projected))
+    started = time.perf_counter()
+    entries = asyncio.run(service.get_searchable_entries())
+    after = (time.perf_counter() - started) / len(projected) * 1e6
+    assert len(entries) == len(projected)
+    print(f"  {'get_searchable_entries()':<40} {after:8.2f} µs/linha")
+    print(f"  ganho: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,13 +14,19 @@ from datetime import datetime
 from models.reseller import (
     SearchRequest, SearchResponse, ResellerResponse, 
     CNPJRequest, CNPJResponse, GeocodeRequest, GeocodeResponse,
-    ImportCSVRequest, ImportCSVResponse
+    ImportCSVRequest
 )
 from services.reseller_service import ResellerService
 from services.cep_service import CEPService
-from services.cnpj_service import CNPJService
+from services.cnpj_service import CNPJService, LOOKUP_FOUND, LOOKUP_THROTTLED
 from services.enhanced_geocoding_service import enhanced_geocoding_service
 from services.optimized_data_service import OptimizedDataService
+from services.cep_cache import cep_coordinates_cache
+from services.cnpj_cache import cnpj_response_cache
+from services.cep_centroid_service import get_centroid_table
+from services.http_clients import http_clients
+from services.job_manager import job_manager
+from services.circuit_breaker import circuit_breakers
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -33,6 +39,8 @@ db = client[os.environ['DB_NAME']]
 # Initialize services
 reseller_service = ResellerService(db)
 optimized_data_service = OptimizedDataService(db)
+cep_coordinates_cache.attach(db)
+cnpj_response_cache.attach(db)
 
 # Create the main app without a prefix
 app = FastAPI(title="Nacional Gás - Reseller Locator API", version="1.0.0")
@@ -149,14 +157,20 @@ async def lookup_cnpj(request: CNPJRequest):
     Busca dados de uma empresa por CNPJ usando BrasilAPI
     """
     try:
-        cnpj_data = await CNPJService.get_company_data(request.cnpj)
+        lookup = await CNPJService.lookup_company(request.cnpj)
         
-        if cnpj_data:
+        if lookup['status'] == LOOKUP_FOUND:
             return CNPJResponse(
                 success=True,
-                data=cnpj_data,
+                data=lookup['data'],
                 message="Dados da empresa encontrados com sucesso"
             )
+        elif lookup['status'] == LOOKUP_THROTTLED:
+            return CNPJResponse(
+                success=False,
+                data=None,
+                message="BrasilAPI limitou as consultas no momento. Tente novamente em instantes."
+            )
         else:
             return CNPJResponse(
                 success=False,
@@ -211,65 +225,100 @@ async def geocode_address(request: GeocodeRequest):
 
 # APIs para processamento de dados
 # APIs otimizadas para processamento de dados
-@api_router.post("/data/import-optimized", response_model=ImportCSVResponse)
-async def import_optimized_data():
+@api_router.post("/data/import-optimized", status_code=202)
+async def import_optimized_data(incremental: bool = False):
     """
-    Importa dados do CSV normalizado otimizado
+    Importa dados do CSV normalizado otimizado em segundo plano
+    
+    Com incremental=true só as linhas alteradas são gravadas (upsert por CNPJ).
+    Retorna o id da tarefa; o progresso é consultado em /data/jobs/{job_id}.
     """
-    try:
-        result = await optimized_data_service.import_normalized_csv()
-        
-        return ImportCSVResponse(
-            success=result['success'],
-            message=result['message'],
-            total_imported=result['total_imported'],
-            total_enriched=0,
-            errors=[]
-        )
-        
-    except Exception as e:
-        logger.error(f"Erro na importação otimizada: {str(e)}")
-        return ImportCSVResponse(
-            success=False,
-            message=f"Erro na importação otimizada: {str(e)}",
-            total_imported=0,
-            total_enriched=0,
-            errors=[str(e)]
-        )
+    async def run_import(job):
+        result = await optimized_data_service.import_normalized_csv(incremental=incremental, progress=job.progress)
+        if not result['success']:
+            raise RuntimeError(result['message'])
+        return result
+    
+    job = job_manager.submit('import', run_import)
+    return {
+        "success": True,
+        "job_id": job.id,
+        "data": job.to_dict()
+    }
 
-@api_router.post("/data/smart-enrich", response_model=ImportCSVResponse)
+@api_router.post("/data/smart-enrich", status_code=202)
 async def smart_enrich_data():
     """
     Enriquecimento inteligente de dados priorizando revendas mais importantes
+    
+    Executa em segundo plano e retorna o id da tarefa (progresso em /data/jobs/{job_id}).
     """
-    try:
-        result = await optimized_data_service.smart_enrich_all_data(batch_size=15)
-        
-        return ImportCSVResponse(
-            success=result['success'],
-            message=result['message'],
-            total_imported=result['total_processed'],
-            total_enriched=result['total_enriched'],
-            errors=[]
-        )
-        
-    except Exception as e:
-        logger.error(f"Erro no enriquecimento inteligente: {str(e)}")
-        return ImportCSVResponse(
-            success=False,
-            message=f"Erro no enriquecimento inteligente: {str(e)}",
-            total_imported=0,
-            total_enriched=0,
-            errors=[str(e)]
+    async def run_smart_enrich(job):
+        result = await optimized_data_service.smart_enrich_all_data(
+            progress=job.progress,
+            cancel_reason=lambda: job.cancel_reason
         )
+        if not result['success']:
+            raise RuntimeError(result['message'])
+        return result
+    
+    job = job_manager.submit('smart_enrich', run_smart_enrich)
+    return {
+        "success": True,
+        "job_id": job.id,
+        "data": job.to_dict()
+    }
+
+@api_router.get("/data/jobs")
+async def list_jobs():
+    """
+    Lista as tarefas em segundo plano (mais recentes primeiro)
+    """
+    return {
+        "success": True,
+        "data": [job.to_dict() for job in job_manager.list()]
+    }
+
+@api_router.get("/data/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """
+    Progresso de uma tarefa: contadores, taxa (itens/s) e ETA
+    """
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada")
+    
+    return {
+        "success": True,
+        "data": job.to_dict()
+    }
+
+@api_router.post("/data/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """
+    Cancela uma tarefa na fila ou em execução
+    """
+    job = job_manager.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada")
+    
+    return {
+        "success": True,
+        "data": job.to_dict()
+    }
 
 @api_router.get("/data/optimized-stats")
 async def get_optimized_stats():
     """
-    Retorna estatísticas otimizadas e detalhadas dos dados
+    Retorna estatísticas otimizadas e detalhadas dos dados e o estado do índice de busca em memória
     """
     try:
         stats = await optimized_data_service.get_optimization_stats()
+        stats['search_index'] = {
+            'mode': reseller_service.search_mode,
+            'resellers': len(reseller_service.spatial_index),
+            'refresher': reseller_service.index_refresher.stats()
+        }
         return {
             "success": True,
             "data": stats
@@ -282,6 +331,22 @@ async def get_optimized_stats():
             "message": f"Erro: {str(e)}"
         }
 
+@api_router.get("/health/providers")
+async def get_providers_health():
+    """
+    Estado dos provedores de geocoding: circuit breakers (taxa de erro, latência, cooldown),
+    fila e chamadas em andamento do pool do Google Maps e acertos dos caches de CEPs e CNPJs
+    """
+    return {
+        "success": True,
+        "data": {
+            "circuit_breakers": circuit_breakers.snapshot(),
+            **enhanced_geocoding_service.stats(),
+            "cep_coordinates_cache": cep_coordinates_cache.stats(),
+            "cnpj_response_cache": cnpj_response_cache.stats()
+        }
+    }
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -306,11 +371,32 @@ async def startup_db():
     """Initialize database"""
     try:
         logger.info("✅ Database connected successfully")
+        
+        # Índices TTL dos caches de coordenadas por CEP e de respostas de CNPJ
+        await cep_coordinates_cache.ensure_indexes()
+        await cnpj_response_cache.ensure_indexes()
+        
+        # Tabela offline de centróides por prefixo de CEP (fallback sem geocoder remoto)
+        logger.info(f"✅ Tabela de centróides de CEP carregada com {len(get_centroid_table())} faixas")
+        
+        # Índices do controle de execuções/backoff do enriquecimento
+        await optimized_data_service.run_store.ensure_indexes()
+        
+    except Exception as e:
+        logger.error(f"❌ Error connecting to database: {str(e)}")
+    
+    try:
+        # Prepara os índices usados pela busca por CEP
+        await reseller_service.initialize()
         # Note: Use /api/data/import-csv to import real reseller data
         # Use /api/data/enrich-all to enrich with CNPJ and geocoding data
     except Exception as e:
-        logger.error(f"❌ Error connecting to database: {str(e)}")
+        logger.error(f"❌ Erro ao preparar a busca de revendas ({reseller_service.search_mode}): {str(e)}")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await job_manager.shutdown()
+    await reseller_service.close()
+    enhanced_geocoding_service.close()
+    await http_clients.aclose()
     client.close()
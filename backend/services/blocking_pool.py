@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+class BlockingCallPool:
+    """
+    Pool de threads dedicado a um cliente síncrono (ex.: googlemaps)
+
+    Isola as chamadas bloqueantes do executor padrão do event loop e limita quantas podem
+    estar na fila: acima de max_workers + max_queue, os chamadores aguardam no próprio
+    event loop (sem ocupar thread) até abrir uma vaga.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int = None):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue if max_queue is not None else max_workers * 4
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-pool")
+        self._slots = asyncio.Semaphore(self.max_workers + self.max_queue)
+        self._lock = threading.Lock()
+
+        self.waiting = 0    # aguardando vaga no event loop
+        self.queued = 0     # enviadas ao pool, esperando thread livre
+        self.in_flight = 0  # executando numa thread
+        self.completed = 0
+        self.failed = 0
+
+    def _run_tracked(self, func: Callable, args: tuple) -> Any:
+        with self._lock:
+            self.queued -= 1
+            self.in_flight += 1
+        try:
+            return func(*args)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+
+    def _forget_cancelled(self, future):
+        # Cancelada antes de começar (chamador cancelado ou shutdown): sai da fila
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+    async def run(self, func: Callable, *args) -> Any:
+        """Executa `func(*args)` no pool e aguarda o resultado"""
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        try:
+            with self._lock:
+                self.queued += 1
+            try:
+                future = self._executor.submit(self._run_tracked, func, args)
+            except RuntimeError:
+                # Pool já encerrado (shutdown da aplicação)
+                with self._lock:
+                    self.queued -= 1
+                raise
+            future.add_done_callback(self._forget_cancelled)
+            return await asyncio.wrap_future(future)
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        """Encerra o pool descartando o que ainda está na fila (chamado no shutdown da aplicação)"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        logger.info(f"🧵 Pool {self.name} encerrado")
+
+    def stats(self) -> Dict:
+        return {
+            'max_workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'waiting': self.waiting,
+            'queued': self.queued,
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'failed': self.failed
+        }
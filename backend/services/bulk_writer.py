@@ -0,0 +1,94 @@
+import os
+import time
+import asyncio
+import logging
+from typing import List, Dict, Any, Optional
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+class BulkUpdateBuffer:
+    """
+    Acumula operações UpdateOne e grava com bulk_write não ordenado
+
+    A gravação acontece ao atingir `max_operations` ou quando a operação mais antiga
+    espera há `max_delay` segundos. Erros são reportados por documento.
+    """
+
+    def __init__(self, collection, max_operations: int = None, max_delay: float = None):
+        self.collection = collection
+        self.max_operations = max_operations or int(os.environ.get('BULK_WRITE_MAX_OPS', 500))
+        self.max_delay = max_delay if max_delay is not None else float(os.environ.get('BULK_WRITE_MAX_DELAY', 1.0))
+
+        self._operations: List[UpdateOne] = []
+        self._keys: List[Any] = []
+        self._timer: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+        self.succeeded = 0
+        self.errors: List[Dict] = []  # {'key': ..., 'error': ...}
+        self.flushes = 0
+
+    def __len__(self) -> int:
+        return len(self._operations)
+
+    async def add(self, operation: UpdateOne, key: Any = None):
+        """Adiciona uma operação; `key` identifica o documento nos erros reportados"""
+        self._operations.append(operation)
+        self._keys.append(key)
+
+        if len(self._operations) >= self.max_operations:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_after_delay())
+
+    async def _flush_after_delay(self):
+        await asyncio.sleep(self.max_delay)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self) -> List[Dict]:
+        """
+        Grava as operações pendentes
+
+        Returns:
+            Erros desta gravação ({'key', 'error'} por documento que falhou)
+        """
+        async with self._lock:
+            if self._timer is not None and self._timer is not asyncio.current_task():
+                self._timer.cancel()
+            self._timer = None
+
+            if not self._operations:
+                return []
+
+            operations, keys = self._operations, self._keys
+            self._operations, self._keys = [], []
+
+            started = time.monotonic()
+            errors = []
+            try:
+                await self.collection.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                errors = [
+                    {'key': keys[write_error['index']], 'error': write_error.get('errmsg', str(write_error))}
+                    for write_error in e.details.get('writeErrors', [])
+                ]
+            except Exception as e:
+                # Falha da requisição inteira: todos os documentos do lote falharam
+                errors = [{'key': key, 'error': str(e)} for key in keys]
+
+            for error in errors:
+                logger.error(f"Erro ao gravar documento {error['key']}: {error['error']}")
+
+            self.flushes += 1
+            self.succeeded += len(operations) - len(errors)
+            self.errors.extend(errors)
+            logger.info(f"💾 bulk_write: {len(operations) - len(errors)}/{len(operations)} gravados em {(time.monotonic() - started) * 1000:.0f}ms")
+            return errors
+
+    async def close(self) -> List[Dict]:
+        """Grava o que restou e retorna todos os erros acumulados"""
+        await self.flush()
+        return self.errors
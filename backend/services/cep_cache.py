@@ -0,0 +1,119 @@
+import os
+import re
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+logger = logging.getLogger(__name__)
+
+class CEPCoordinatesCache:
+    """Cache de coordenadas por CEP em dois níveis: LRU em memória na frente de uma coleção MongoDB com TTL"""
+
+    def __init__(self, max_entries: int = None, ttl_days: float = None):
+        self.max_entries = max_entries or int(os.environ.get('CEP_CACHE_MAX_ENTRIES', 20000))
+        self.ttl_seconds = (ttl_days or float(os.environ.get('CEP_CACHE_TTL_DAYS', 90))) * 86400
+
+        # cep -> (coordenadas, expira_em epoch)
+        self._entries: "OrderedDict[str, Tuple[Dict, float]]" = OrderedDict()
+        self.collection = None
+
+        self.memory_hits = 0
+        self.database_hits = 0
+        self.misses = 0
+
+    def attach(self, db: AsyncIOMotorDatabase):
+        """Associa o cache persistente à coleção cep_cache"""
+        self.collection = db.cep_cache
+
+    async def ensure_indexes(self):
+        """Cria o índice TTL que remove entradas expiradas"""
+        if self.collection is not None:
+            await self.collection.create_index("expires_at", expireAfterSeconds=0, name="expires_at_ttl")
+
+    @staticmethod
+    def normalize(cep: str) -> Optional[str]:
+        """Normaliza o CEP para 8 dígitos (chave do cache)"""
+        clean_cep = re.sub(r'\D', '', cep or '')
+        return clean_cep if len(clean_cep) == 8 else None
+
+    def _remember(self, key: str, coordinates: Dict, expires_at: float):
+        self._entries[key] = (coordinates, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, cep: str) -> Optional[Dict]:
+        """
+        Busca coordenadas em cache
+
+        Returns:
+            Dict com lat, lng e source (provedor que respondeu) ou None
+        """
+        key = self.normalize(cep)
+        if not key:
+            return None
+
+        entry = self._entries.get(key)
+        if entry:
+            coordinates, expires_at = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return coordinates
+            del self._entries[key]
+
+        if self.collection is not None:
+            try:
+                doc = await self.collection.find_one({"_id": key})
+                if doc and doc['expires_at'] > datetime.utcnow():
+                    coordinates = {'lat': doc['lat'], 'lng': doc['lng'], 'source': doc.get('source')}
+                    expires_in = (doc['expires_at'] - datetime.utcnow()).total_seconds()
+                    self._remember(key, coordinates, time.time() + expires_in)
+                    self.database_hits += 1
+                    return coordinates
+            except Exception as e:
+                logger.error(f"Erro ao ler cache de CEP {key}: {str(e)}")
+
+        self.misses += 1
+        return None
+
+    async def set(self, cep: str, lat: float, lng: float, source: Optional[str]):
+        """Grava coordenadas nos dois níveis do cache"""
+        key = self.normalize(cep)
+        if not key:
+            return
+
+        coordinates = {'lat': lat, 'lng': lng, 'source': source}
+        self._remember(key, coordinates, time.time() + self.ttl_seconds)
+
+        if self.collection is not None:
+            now = datetime.utcnow()
+            try:
+                await self.collection.update_one(
+                    {"_id": key},
+                    {"$set": {
+                        'lat': lat,
+                        'lng': lng,
+                        'source': source,
+                        'cached_at': now,
+                        'expires_at': now + timedelta(seconds=self.ttl_seconds)
+                    }},
+                    upsert=True
+                )
+            except Exception as e:
+                logger.error(f"Erro ao gravar cache de CEP {key}: {str(e)}")
+
+    def stats(self) -> Dict:
+        """Estatísticas de uso do cache"""
+        return {
+            'entries_in_memory': len(self._entries),
+            'memory_hits': self.memory_hits,
+            'database_hits': self.database_hits,
+            'misses': self.misses
+        }
+
+# Instância global compartilhada pelas buscas
+cep_coordinates_cache = CEPCoordinatesCache()
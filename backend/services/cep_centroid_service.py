@@ -0,0 +1,115 @@
+import csv
+import re
+import logging
+import numpy as np
+from pathlib import Path
+from typing import Optional, Dict
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).parent.parent / 'data'
+
+# Fonte editável (faixas de prefixo de 5 dígitos) e tabela binária compilada a partir dela
+CENTROIDS_CSV_PATH = DATA_DIR / 'cep_centroids.csv'
+CENTROIDS_TABLE_PATH = DATA_DIR / 'cep_centroids.npy'
+
+# Faixas ordenadas e sem sobreposição: [start, end] de prefixos de 5 dígitos -> centróide
+CENTROIDS_DTYPE = np.dtype([('start', '<u4'), ('end', '<u4'), ('lat', '<f4'), ('lng', '<f4')])
+
+PREFIX_SPACE = 100000
+
+
+class CEPCentroidTable:
+    """Tabela offline de centróides por prefixo de CEP (5 dígitos), consultada por busca binária"""
+
+    def __init__(self, table: np.ndarray):
+        self.table = table
+        self.starts = table['start']
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    @staticmethod
+    def compile_csv(csv_path: Path = CENTROIDS_CSV_PATH) -> np.ndarray:
+        """
+        Compila o CSV de faixas em um array ordenado sem sobreposição
+
+        Faixas mais estreitas (cidades, bairros) sobrescrevem as mais largas (estados, regiões).
+        """
+        with open(csv_path, 'r', encoding='utf-8') as file:
+            rows = [
+                (int(row['start']), int(row['end']), float(row['lat']), float(row['lng']))
+                for row in csv.DictReader(file)
+            ]
+
+        # Pinta o espaço de prefixos da faixa mais larga para a mais estreita
+        painted = np.full(PREFIX_SPACE, -1, dtype=np.int32)
+        for row_index in sorted(range(len(rows)), key=lambda i: rows[i][0] - rows[i][1]):
+            start, end = rows[row_index][0], rows[row_index][1]
+            painted[start:end + 1] = row_index
+
+        # Converte as sequências contínuas do mesmo centróide em faixas
+        boundaries = np.flatnonzero(np.diff(painted)) + 1
+        run_starts = np.concatenate(([0], boundaries))
+        run_ends = np.concatenate((boundaries - 1, [PREFIX_SPACE - 1]))
+
+        intervals = [
+            (start, end, rows[painted[start]][2], rows[painted[start]][3])
+            for start, end in zip(run_starts.tolist(), run_ends.tolist())
+            if painted[start] >= 0
+        ]
+        return np.array(intervals, dtype=CENTROIDS_DTYPE)
+
+    @classmethod
+    def load(cls, table_path: Path = CENTROIDS_TABLE_PATH) -> 'CEPCentroidTable':
+        """Carrega a tabela binária por memory map (compila o CSV se o binário não existir)"""
+        if Path(table_path).exists():
+            table = np.load(table_path, mmap_mode='r')
+        else:
+            logger.warning(f"Tabela de centróides não encontrada em {table_path}, compilando a partir do CSV")
+            table = cls.compile_csv()
+
+        return cls(table)
+
+    def lookup(self, cep: str) -> Optional[Dict[str, float]]:
+        """
+        Centróide aproximado do CEP
+
+        Returns:
+            Dict com lat, lng e span (quantos prefixos a faixa cobre; menor = mais preciso) ou None
+        """
+        clean_cep = re.sub(r'\D', '', cep or '')
+        if len(clean_cep) < 5:
+            return None
+
+        prefix = int(clean_cep[:5])
+        position = int(np.searchsorted(self.starts, prefix, side='right')) - 1
+        if position < 0:
+            return None
+
+        entry = self.table[position]
+        if prefix > entry['end']:
+            return None
+
+        return {
+            'lat': round(float(entry['lat']), 4),
+            'lng': round(float(entry['lng']), 4),
+            'span': int(entry['end']) - int(entry['start']) + 1
+        }
+
+
+_centroid_table: Optional[CEPCentroidTable] = None
+
+def get_centroid_table() -> CEPCentroidTable:
+    """Tabela de centróides compartilhada (carregada na primeira consulta)"""
+    global _centroid_table
+    if _centroid_table is None:
+        _centroid_table = CEPCentroidTable.load()
+    return _centroid_table
+
+
+if __name__ == '__main__':
+    # Recompila a tabela binária: python -m services.cep_centroid_service
+    compiled = CEPCentroidTable.compile_csv()
+    np.save(CENTROIDS_TABLE_PATH, compiled)
+    print(f"{len(compiled)} faixas gravadas em {CENTROIDS_TABLE_PATH} ({compiled.nbytes} bytes)")
@@ -1,9 +1,25 @@
 import httpx
 import re
+import os
+import asyncio
+import logging
 from typing import Optional, Dict
 from services.enhanced_geocoding_service import enhanced_geocoding_service
+from services.cep_cache import cep_coordinates_cache
+from services.cep_centroid_service import get_centroid_table
+
+logger = logging.getLogger(__name__)
 
 class CEPService:
+    # Tempo máximo de espera pelo geocoder remoto antes de responder com o centróide offline
+    REMOTE_TIMEOUT = float(os.environ.get('CEP_GEOCODE_TIMEOUT', 3.0))
+    
+    # Responde sempre com o centróide offline e usa o geocoder remoto só para refinar o cache
+    OFFLINE_FIRST = os.environ.get('CEP_OFFLINE_FIRST', 'false').lower() == 'true'
+    
+    # Refinamentos remotos em andamento (referência forte para não serem coletados)
+    _pending_refinements = set()
+    
     @staticmethod
     def validate_cep(cep: str) -> bool:
         """Valida formato do CEP brasileiro"""
@@ -27,7 +43,7 @@ class CEPService:
     @staticmethod
     async def get_coordinates_from_cep(cep: str) -> Optional[Dict[str, float]]:
         """
-        Obtém coordenadas a partir do CEP usando Google Maps
+        Obtém coordenadas a partir do CEP usando Google Maps (com cache por CEP)
         """
         try:
             # Limpa e valida CEP
@@ -35,54 +51,68 @@ class CEPService:
             if not CEPService.validate_cep(clean_cep):
                 return None
             
-            # Usa o enhanced geocoding service (Google Maps + fallback)
-            coord_data = await enhanced_geocoding_service.get_coordinates_from_cep(cep)
-            
-            if coord_data:
+            # CEP já consultado: responde do cache, sem chamada externa
+            cached = await cep_coordinates_cache.get(clean_cep)
+            if cached:
                 return {
-                    'lat': coord_data['lat'],
-                    'lng': coord_data['lng']
+                    'lat': cached['lat'],
+                    'lng': cached['lng']
                 }
             
-            return None
+            if CEPService.OFFLINE_FIRST:
+                fallback = CEPService.get_fallback_coordinates(clean_cep)
+                if fallback:
+                    CEPService._refine_in_background(asyncio.ensure_future(CEPService._geocode_and_cache(clean_cep)))
+                    return fallback
+            
+            # Usa o enhanced geocoding service (Google Maps + fallback) com tempo limite
+            remote = asyncio.ensure_future(CEPService._geocode_and_cache(clean_cep))
+            try:
+                return await asyncio.wait_for(asyncio.shield(remote), timeout=CEPService.REMOTE_TIMEOUT)
+            except asyncio.TimeoutError:
+                # Geocoder lento ou fora do ar: responde com o centróide e deixa a chamada refinar o cache
+                logger.warning(f"Geocoder remoto excedeu {CEPService.REMOTE_TIMEOUT}s para o CEP {clean_cep}, usando centróide offline")
+                CEPService._refine_in_background(remote)
+                return CEPService.get_fallback_coordinates(clean_cep)
             
         except Exception as e:
             return None
     
+    @staticmethod
+    async def _geocode_and_cache(clean_cep: str) -> Optional[Dict[str, float]]:
+        """Consulta o geocoder remoto e grava o resultado no cache de CEPs"""
+        coord_data = await enhanced_geocoding_service.get_coordinates_from_cep(clean_cep)
+        
+        if coord_data:
+            await cep_coordinates_cache.set(clean_cep, coord_data['lat'], coord_data['lng'], coord_data.get('api_source'))
+            return {
+                'lat': coord_data['lat'],
+                'lng': coord_data['lng']
+            }
+        
+        return None
+    
+    @staticmethod
+    def _refine_in_background(task: asyncio.Future):
+        """Mantém a consulta remota rodando em segundo plano até ela gravar o cache"""
+        CEPService._pending_refinements.add(task)
+        task.add_done_callback(CEPService._pending_refinements.discard)
+    
     @staticmethod
     def get_fallback_coordinates(cep: str) -> Optional[Dict[str, float]]:
         """
-        Coordenadas aproximadas baseadas nos primeiros dígitos do CEP (fallback)
+        Coordenadas aproximadas pelo centróide offline do prefixo do CEP (fallback)
         """
         try:
-            clean_cep = re.sub(r'\D', '', cep)
-            if len(clean_cep) < 5:
+            centroid = get_centroid_table().lookup(cep)
+            if not centroid:
                 return None
             
-            # Mapeamento aproximado dos primeiros dígitos de CEP para regiões
-            cep_region = clean_cep[:2]
-            
-            # Coordenadas aproximadas por região (centro das principais cidades)
-            regions = {
-                '01': {'lat': -23.5505, 'lng': -46.6333},  # São Paulo - Centro
-                '02': {'lat': -23.5505, 'lng': -46.6333},  # São Paulo - Zona Norte
-                '03': {'lat': -23.5505, 'lng': -46.6333},  # São Paulo - Zona Leste
-                '04': {'lat': -23.5505, 'lng': -46.6333},  # São Paulo - Zona Sul
-                '05': {'lat': -23.5505, 'lng': -46.6333},  # São Paulo - Zona Oeste
-                '08': {'lat': -23.5505, 'lng': -46.6333},  # São Paulo - Região Metropolitana
-                '20': {'lat': -22.9068, 'lng': -43.1729},  # Rio de Janeiro - Centro
-                '21': {'lat': -22.9068, 'lng': -43.1729},  # Rio de Janeiro - Zona Norte
-                '22': {'lat': -22.9068, 'lng': -43.1729},  # Rio de Janeiro - Zona Sul
-                '30': {'lat': -19.9191, 'lng': -43.9378},  # Belo Horizonte
-                '40': {'lat': -12.9714, 'lng': -38.5014},  # Salvador
-                '50': {'lat': -8.0476, 'lng': -34.8770},   # Recife
-                '60': {'lat': -3.7172, 'lng': -38.5434},   # Fortaleza
-                '70': {'lat': -15.7942, 'lng': -47.8825},  # Brasília
-                '80': {'lat': -25.4244, 'lng': -49.2654},  # Curitiba
-                '90': {'lat': -30.0346, 'lng': -51.2177},  # Porto Alegre
+            return {
+                'lat': centroid['lat'],
+                'lng': centroid['lng']
             }
             
-            return regions.get(cep_region)
-            
-        except Exception:
+        except Exception as e:
+            logger.error(f"Erro na tabela de centróides para o CEP {cep}: {str(e)}")
             return None
\ No newline at end of file
@@ -0,0 +1,172 @@
+import os
+import time
+import logging
+from collections import deque
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de um provedor externo com janela deslizante das últimas chamadas
+
+    A janela guarda as últimas `window_size` chamadas dos últimos `window_seconds`, para que
+    falhas antigas não rebaixem o provedor para sempre. Abre quando a taxa de erro da janela
+    passa do limite (com um mínimo de chamadas); aberto, o provedor é pulado durante o
+    cooldown. Depois disso uma única chamada de teste (half-open) decide se ele volta (closed)
+    ou se abre de novo.
+    """
+
+    def __init__(self, name: str, window_size: int = None, window_seconds: float = None, min_calls: int = None,
+                 error_rate_threshold: float = None, cooldown_seconds: float = None):
+        self.name = name
+        self.window_size = window_size or int(os.environ.get('BREAKER_WINDOW_SIZE', 20))
+        self.window_seconds = window_seconds or float(os.environ.get('BREAKER_WINDOW_SECONDS', 120))
+        self.min_calls = min_calls or int(os.environ.get('BREAKER_MIN_CALLS', 5))
+        self.error_rate_threshold = error_rate_threshold or float(os.environ.get('BREAKER_ERROR_RATE', 0.5))
+        self.cooldown_seconds = cooldown_seconds or float(os.environ.get('BREAKER_COOLDOWN_SECONDS', 30))
+
+        self.state = STATE_CLOSED
+        self._calls: deque = deque(maxlen=self.window_size)  # (instante, sucesso, latência em segundos)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.times_opened = 0
+
+    def _recent_calls(self) -> deque:
+        expired_before = time.monotonic() - self.window_seconds
+        while self._calls and self._calls[0][0] < expired_before:
+            self._calls.popleft()
+        return self._calls
+
+    @property
+    def has_enough_calls(self) -> bool:
+        return len(self._recent_calls()) >= self.min_calls
+
+    @property
+    def error_rate(self) -> float:
+        calls = self._recent_calls()
+        if not calls:
+            return 0.0
+        return sum(1 for _, ok, _ in calls if not ok) / len(calls)
+
+    @property
+    def average_latency(self) -> float:
+        calls = self._recent_calls()
+        if not calls:
+            return 0.0
+        return sum(latency for _, _, latency in calls) / len(calls)
+
+    def allow_request(self) -> bool:
+        """Indica se o provedor pode ser chamado agora (no half-open, só a chamada de teste)"""
+        if self.state == STATE_CLOSED:
+            return True
+
+        if self.state == STATE_OPEN:
+            if time.monotonic() - self._opened_at < self.cooldown_seconds:
+                return False
+            self.state = STATE_HALF_OPEN
+            self._probe_in_flight = False
+            logger.info(f"🟡 Circuit breaker {self.name}: half-open, testando o provedor")
+
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def is_available(self) -> bool:
+        """Como allow_request, mas sem reservar a chamada de teste"""
+        if self.state == STATE_OPEN:
+            return time.monotonic() - self._opened_at >= self.cooldown_seconds
+        if self.state == STATE_HALF_OPEN:
+            return not self._probe_in_flight
+        return True
+
+    def release_probe(self):
+        """Libera a chamada de teste do half-open sem registrar resultado (ex.: chamada cancelada)"""
+        self._probe_in_flight = False
+
+    def record_success(self, latency: float):
+        self._calls.append((time.monotonic(), True, latency))
+        if self.state == STATE_HALF_OPEN:
+            self.state = STATE_CLOSED
+            self._probe_in_flight = False
+            self._calls.clear()
+            self._calls.append((time.monotonic(), True, latency))
+            logger.info(f"🟢 Circuit breaker {self.name}: fechado, provedor recuperado")
+
+    def record_failure(self, latency: float):
+        self._calls.append((time.monotonic(), False, latency))
+        if self.state == STATE_HALF_OPEN:
+            self._open()
+        elif self.state == STATE_CLOSED and self.has_enough_calls and self.error_rate >= self.error_rate_threshold:
+            self._open()
+
+    def _open(self):
+        self.state = STATE_OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        self.times_opened += 1
+        logger.warning(
+            f"🔴 Circuit breaker {self.name}: aberto por {self.cooldown_seconds:.0f}s "
+            f"(taxa de erro {self.error_rate:.0%})"
+        )
+
+    def snapshot(self) -> Dict:
+        cooldown_remaining = 0.0
+        if self.state == STATE_OPEN:
+            cooldown_remaining = max(self.cooldown_seconds - (time.monotonic() - self._opened_at), 0.0)
+        return {
+            'state': self.state,
+            'error_rate': round(self.error_rate, 3),
+            'average_latency_ms': round(self.average_latency * 1000, 1),
+            'calls_in_window': len(self._recent_calls()),
+            'times_opened': self.times_opened,
+            'cooldown_remaining_seconds': round(cooldown_remaining, 1)
+        }
+
+
+class CircuitBreakerRegistry:
+    """Um circuit breaker por provedor, compartilhado por todos os chamadores"""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, provider: str) -> CircuitBreaker:
+        breaker = self._breakers.get(provider)
+        if breaker is None:
+            breaker = self._breakers[provider] = CircuitBreaker(provider)
+        return breaker
+
+    def order_by_health(self, providers: List[str]) -> List[str]:
+        """
+        Ordena os provedores pela saúde recente, mantendo a ordem de preferência no empate
+
+        Disponíveis antes dos abertos; depois menor taxa de erro (em faixas de 10%) e menor
+        latência média (em faixas de 1s). Provedores com poucas chamadas na janela ainda não
+        são rebaixados, senão uma falha isolada tiraria o preferido do caminho para sempre; o
+        mesmo vale para quem terminou o cooldown e aguarda a chamada de teste.
+        """
+        def health_key(indexed):
+            preference, provider = indexed
+            breaker = self.get(provider)
+            if breaker.state != STATE_CLOSED or not breaker.has_enough_calls:
+                return (not breaker.is_available(), 0.0, 0, preference)
+            return (
+                not breaker.is_available(),
+                round(breaker.error_rate, 1),
+                int(breaker.average_latency),
+                preference
+            )
+
+        return [provider for _, provider in sorted(enumerate(providers), key=health_key)]
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return {provider: breaker.snapshot() for provider, breaker in self._breakers.items()}
+
+# Instância global compartilhada pelos serviços de geocoding
+circuit_breakers = CircuitBreakerRegistry()
@@ -0,0 +1,99 @@
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+logger = logging.getLogger(__name__)
+
+class CNPJResponseCache:
+    """
+    Cache persistente das respostas da BrasilAPI (coleção cnpj_cache com TTL)
+
+    CNPJs encontrados ficam válidos por CNPJ_CACHE_TTL_DAYS; CNPJs inexistentes (404) são
+    guardados como resultado negativo por um período menor (CNPJ_CACHE_NEGATIVE_TTL_HOURS).
+    """
+
+    def __init__(self, ttl_days: float = None, negative_ttl_hours: float = None):
+        self.ttl = timedelta(days=ttl_days or float(os.environ.get('CNPJ_CACHE_TTL_DAYS', 30)))
+        self.negative_ttl = timedelta(hours=negative_ttl_hours or float(os.environ.get('CNPJ_CACHE_NEGATIVE_TTL_HOURS', 24)))
+        self.collection = None
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def attach(self, db: AsyncIOMotorDatabase):
+        """Associa o cache à coleção cnpj_cache"""
+        self.collection = db.cnpj_cache
+
+    async def ensure_indexes(self):
+        """Cria o índice TTL que remove entradas expiradas"""
+        if self.collection is not None:
+            await self.collection.create_index("expires_at", expireAfterSeconds=0, name="expires_at_ttl")
+
+    async def get(self, cnpj: str) -> Tuple[bool, Optional[Dict]]:
+        """
+        Busca a resposta em cache de um CNPJ normalizado
+
+        Returns:
+            (encontrado_no_cache, dados) - dados é None quando o cache guarda um 404
+        """
+        if self.collection is None:
+            return False, None
+
+        try:
+            doc = await self.collection.find_one({"_id": cnpj})
+        except Exception as e:
+            logger.error(f"Erro ao ler cache do CNPJ {cnpj}: {str(e)}")
+            return False, None
+
+        # O monitor de TTL do MongoDB roda a cada ~60s: confere a validade na leitura também
+        if not doc or doc['expires_at'] <= datetime.utcnow():
+            self.misses += 1
+            return False, None
+
+        if doc.get('found'):
+            self.hits += 1
+            return True, doc['data']
+
+        self.negative_hits += 1
+        return True, None
+
+    async def set(self, cnpj: str, data: Dict):
+        """Grava uma resposta encontrada"""
+        await self._store(cnpj, True, data, self.ttl)
+
+    async def set_not_found(self, cnpj: str):
+        """Grava um 404 (cache negativo, com TTL menor)"""
+        await self._store(cnpj, False, None, self.negative_ttl)
+
+    async def _store(self, cnpj: str, found: bool, data: Optional[Dict], ttl: timedelta):
+        if self.collection is None:
+            return
+
+        now = datetime.utcnow()
+        try:
+            await self.collection.update_one(
+                {"_id": cnpj},
+                {"$set": {
+                    'found': found,
+                    'data': data,
+                    'cached_at': now,
+                    'expires_at': now + ttl
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Erro ao gravar cache do CNPJ {cnpj}: {str(e)}")
+
+    def stats(self) -> Dict:
+        """Estatísticas de uso do cache"""
+        return {
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses
+        }
+
+# Instância global usada por CNPJService
+cnpj_response_cache = CNPJResponseCache()
@@ -1,11 +1,28 @@
-import httpx
 import asyncio
 import logging
 import re
-from typing import Optional, Dict
+import pandas as pd
+from typing import Optional, Dict, Iterable, AsyncIterator, Tuple
+from services.http_clients import http_clients
+from services.retry_policy import default_retry_policy
+from services.cnpj_cache import cnpj_response_cache
+from services.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# Marca o fim do iterável de CNPJs em stream_companies_data
+_EXHAUSTED = object()
+
+# Resultado de CNPJService.lookup_company
+LOOKUP_FOUND = 'found'
+LOOKUP_NOT_FOUND = 'not_found'
+LOOKUP_THROTTLED = 'throttled'
+LOOKUP_ERROR = 'error'
+LOOKUP_INVALID = 'invalid'
+
+# Consultas simultâneas do mesmo CNPJ compartilham uma única requisição
+_company_lookups = SingleFlight('cnpj')
+
 class CNPJService:
     """Service for CNPJ data retrieval using BrasilAPI"""
     
@@ -36,6 +53,26 @@ class CNPJService:
         
         return cnpj_clean
     
+    @staticmethod
+    def normalize_cnpj_series(cnpjs: pd.Series) -> pd.Series:
+        """
+        Versão vetorizada de normalize_cnpj para colunas do pandas
+        
+        Repara notação científica (ex.: '3.6096913E+7') e valores com '.0' de colunas lidas como float,
+        remove caracteres não numéricos e completa com zeros à esquerda. Valores vazios viram ''.
+        """
+        cnpjs = cnpjs.astype('string').str.strip().fillna('')
+        
+        # Números em notação científica ou com casa decimal: converte pelo valor numérico
+        numeric_like = cnpjs.str.fullmatch(r'\d+\.\d*([eE][+-]?\d+)?|\d+(\.\d*)?[eE][+-]?\d+')
+        if numeric_like.any():
+            values = pd.to_numeric(cnpjs[numeric_like], errors='coerce')
+            cnpjs = cnpjs.copy()
+            cnpjs[numeric_like] = values.round().astype('Int64').astype('string')
+        
+        digits = cnpjs.str.replace(r'\D', '', regex=True).fillna('')
+        return digits.where(digits == '', digits.str.zfill(14))
+    
     @staticmethod
     def validate_cnpj(cnpj: str) -> bool:
         """
@@ -53,68 +90,105 @@ class CNPJService:
             cnpj: CNPJ da empresa (com ou sem formatação)
             
         Returns:
-            Dict com dados da empresa ou None se não encontrar
+            Dict com dados da empresa ou None se não encontrar (use lookup_company para saber o motivo)
+        """
+        lookup = await CNPJService.lookup_company(cnpj)
+        return lookup['data']
+    
+    @staticmethod
+    async def lookup_company(cnpj: str) -> Dict:
+        """
+        Consulta um CNPJ informando o resultado da consulta
+        
+        Respostas (inclusive 404) ficam no cache persistente de CNPJ: só CNPJs sem entrada
+        válida no cache geram requisição. 429/5xx são repetidos com backoff dentro do prazo da chamada.
+        
+        Returns:
+            Dict com status ('found', 'not_found', 'throttled', 'error' ou 'invalid'), data e error
         """
         try:
             cnpj_normalized = CNPJService.normalize_cnpj(cnpj)
             
             if not CNPJService.validate_cnpj(cnpj_normalized):
                 logger.warning(f"CNPJ inválido: {cnpj}")
-                return None
+                return CNPJService._lookup_result(LOOKUP_INVALID, error='CNPJ inválido')
+            
+            return await _company_lookups.do(cnpj_normalized, lambda: CNPJService._fetch_company_data(cnpj_normalized))
+            
+        except Exception as e:
+            logger.error(f"Erro na consulta CNPJ {cnpj}: {str(e)}")
+            return CNPJService._lookup_result(LOOKUP_ERROR, error=str(e))
+    
+    @staticmethod
+    def _lookup_result(status: str, data: Optional[Dict] = None, error: Optional[str] = None) -> Dict:
+        return {'status': status, 'data': data, 'error': error}
+    
+    @staticmethod
+    async def _fetch_company_data(cnpj_normalized: str) -> Dict:
+        """Consulta um CNPJ já normalizado (cache persistente e depois BrasilAPI)"""
+        try:
+            cached, cached_data = await cnpj_response_cache.get(cnpj_normalized)
+            if cached:
+                return CNPJService._lookup_result(LOOKUP_FOUND if cached_data else LOOKUP_NOT_FOUND, cached_data)
             
             url = f"{CNPJService.BASE_URL}/cnpj/v1/{cnpj_normalized}"
             
-            async with httpx.AsyncClient(timeout=CNPJService.TIMEOUT) as client:
-                logger.info(f"Buscando dados do CNPJ: {cnpj_normalized}")
-                response = await client.get(url)
+            client = http_clients.get('brasilapi')
+            logger.info(f"Buscando dados do CNPJ: {cnpj_normalized}")
+            outcome = await default_retry_policy.send(
+                'brasilapi', lambda timeout: client.get(url, timeout=timeout), CNPJService.TIMEOUT
+            )
+            response = outcome.response
+            
+            if outcome.throttled:
+                logger.warning(f"Rate limit excedido para CNPJ: {cnpj_normalized}")
+                return CNPJService._lookup_result(LOOKUP_THROTTLED, error=outcome.error)
+            
+            if response is None or response.status_code >= 500:
+                logger.error(f"Erro na consulta CNPJ {cnpj_normalized}: {outcome.error}")
+                return CNPJService._lookup_result(LOOKUP_ERROR, error=outcome.error)
+            
+            if response.status_code == 200:
+                data = response.json()
+                
+                # Extrai endereço formatado
+                endereco_formatado = CNPJService._format_address(data)
+                
+                result = {
+                    'cnpj': cnpj_normalized,
+                    'razao_social': data.get('razao_social', ''),
+                    'nome_fantasia': data.get('nome_fantasia', ''),
+                    'endereco_completo': endereco_formatado,
+                    'logradouro': data.get('logradouro', ''),
+                    'numero': data.get('numero', ''),
+                    'complemento': data.get('complemento', ''),
+                    'bairro': data.get('bairro', ''),
+                    'cidade': data.get('municipio', ''),
+                    'estado': data.get('uf', ''),
+                    'cep': data.get('cep', ''),
+                    'telefone': data.get('ddd_telefone_1', ''),
+                    'email': data.get('email', ''),
+                    'atividade_principal': data.get('cnae_fiscal_descricao', ''),
+                    'situacao': data.get('descricao_situacao_cadastral', ''),
+                    'data_situacao': data.get('data_situacao_cadastral', ''),
+                    'api_source': 'brasilapi'
+                }
+                
+                logger.info(f"✅ Dados encontrados para CNPJ {cnpj_normalized}")
+                await cnpj_response_cache.set(cnpj_normalized, result)
+                return CNPJService._lookup_result(LOOKUP_FOUND, result)
+                
+            elif response.status_code == 404:
+                logger.warning(f"CNPJ não encontrado: {cnpj_normalized}")
+                await cnpj_response_cache.set_not_found(cnpj_normalized)
+                return CNPJService._lookup_result(LOOKUP_NOT_FOUND)
+            else:
+                logger.error(f"Erro na consulta CNPJ {cnpj_normalized}: {response.status_code}")
+                return CNPJService._lookup_result(LOOKUP_ERROR, error=f"HTTP {response.status_code}")
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    
-                    # Extrai endereço formatado
-                    endereco_formatado = CNPJService._format_address(data)
-                    
-                    result = {
-                        'cnpj': cnpj_normalized,
-                        'razao_social': data.get('razao_social', ''),
-                        'nome_fantasia': data.get('nome_fantasia', ''),
-                        'endereco_completo': endereco_formatado,
-                        'logradouro': data.get('logradouro', ''),
-                        'numero': data.get('numero', ''),
-                        'complemento': data.get('complemento', ''),
-                        'bairro': data.get('bairro', ''),
-                        'cidade': data.get('municipio', ''),
-                        'estado': data.get('uf', ''),
-                        'cep': data.get('cep', ''),
-                        'telefone': data.get('ddd_telefone_1', ''),
-                        'email': data.get('email', ''),
-                        'atividade_principal': data.get('cnae_fiscal_descricao', ''),
-                        'situacao': data.get('descricao_situacao_cadastral', ''),
-                        'data_situacao': data.get('data_situacao_cadastral', ''),
-                        'api_source': 'brasilapi'
-                    }
-                    
-                    logger.info(f"✅ Dados encontrados para CNPJ {cnpj_normalized}")
-                    return result
-                    
-                elif response.status_code == 404:
-                    logger.warning(f"CNPJ não encontrado: {cnpj_normalized}")
-                    return None
-                elif response.status_code == 429:
-                    logger.warning(f"Rate limit excedido para CNPJ: {cnpj_normalized}")
-                    # Aguarda um pouco antes de tentar novamente
-                    await asyncio.sleep(1)
-                    return None
-                else:
-                    logger.error(f"Erro na consulta CNPJ {cnpj_normalized}: {response.status_code}")
-                    return None
-                    
-        except httpx.TimeoutException:
-            logger.error(f"Timeout na consulta CNPJ: {cnpj}")
-            return None
         except Exception as e:
-            logger.error(f"Erro na consulta CNPJ {cnpj}: {str(e)}")
-            return None
+            logger.error(f"Erro na consulta CNPJ {cnpj_normalized}: {str(e)}")
+            return CNPJService._lookup_result(LOOKUP_ERROR, error=str(e))
     
     @staticmethod
     def _format_address(data: Dict) -> str:
@@ -154,14 +228,62 @@ class CNPJService:
         return ", ".join([p for p in parts if p])
     
     @staticmethod
-    async def batch_get_companies_data(cnpjs: list, batch_size: int = 5, delay: float = 0.2) -> Dict[str, Dict]:
+    async def stream_companies_data(cnpjs: Iterable[str], concurrency: int = 5) -> AsyncIterator[Tuple[str, Dict]]:
+        """
+        Busca dados de múltiplas empresas mantendo sempre `concurrency` requisições em andamento
+        
+        Uma requisição lenta não segura as demais: cada resultado é entregue assim que fica pronto
+        e a vaga é imediatamente ocupada pelo próximo CNPJ.
+        
+        Args:
+            cnpjs: CNPJs a consultar (lista ou qualquer iterável)
+            concurrency: Número máximo de requisições simultâneas
+            
+        Yields:
+            Tuplas (CNPJ normalizado, resultado de lookup_company), na ordem de conclusão
+        """
+        pending = iter(cnpjs)
+        in_flight: Dict[asyncio.Future, str] = {}
+        
+        def fill():
+            while len(in_flight) < concurrency:
+                cnpj = next(pending, _EXHAUSTED)
+                if cnpj is _EXHAUSTED:
+                    return
+                in_flight[asyncio.ensure_future(CNPJService.lookup_company(cnpj))] = cnpj
+        
+        try:
+            fill()
+            while in_flight:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                
+                completed = []
+                for task in done:
+                    cnpj_normalized = CNPJService.normalize_cnpj(in_flight.pop(task))
+                    try:
+                        completed.append((cnpj_normalized, task.result()))
+                    except Exception as e:
+                        logger.error(f"Erro no CNPJ {cnpj_normalized}: {e}")
+                        completed.append((cnpj_normalized, CNPJService._lookup_result(LOOKUP_ERROR, error=str(e))))
+                
+                # Repõe as vagas antes de entregar os resultados
+                fill()
+                
+                for item in completed:
+                    yield item
+        finally:
+            # Consumidor parou antes do fim: cancela o que ainda está em andamento
+            for task in in_flight:
+                task.cancel()
+    
+    @staticmethod
+    async def batch_get_companies_data(cnpjs: list, batch_size: int = 5) -> Dict[str, Dict]:
         """
-        Busca dados de múltiplas empresas em lote com controle de rate limit
+        Busca dados de múltiplas empresas em lote (o ritmo é controlado pelo rate limiter da BrasilAPI)
         
         Args:
             cnpjs: Lista de CNPJs
             batch_size: Número de requisições simultâneas
-            delay: Delay entre lotes (segundos)
             
         Returns:
             Dict com CNPJ como chave e dados da empresa como valor
@@ -170,30 +292,12 @@ class CNPJService:
         
         logger.info(f"Iniciando busca em lote de {len(cnpjs)} CNPJs")
         
-        for i in range(0, len(cnpjs), batch_size):
-            batch = cnpjs[i:i + batch_size]
-            
-            logger.info(f"Processando lote {i//batch_size + 1}/{(len(cnpjs) + batch_size - 1)//batch_size}")
-            
-            # Processa lote atual
-            tasks = [CNPJService.get_company_data(cnpj) for cnpj in batch]
-            batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Processa resultados
-            for cnpj, result in zip(batch, batch_results):
-                cnpj_normalized = CNPJService.normalize_cnpj(cnpj)
-                
-                if isinstance(result, Exception):
-                    logger.error(f"Erro no CNPJ {cnpj_normalized}: {result}")
-                    results[cnpj_normalized] = None
-                else:
-                    results[cnpj_normalized] = result
-            
-            # Aguarda antes do próximo lote
-            if i + batch_size < len(cnpjs):
-                await asyncio.sleep(delay)
+        throttled = 0
+        async for cnpj_normalized, lookup in CNPJService.stream_companies_data(cnpjs, concurrency=batch_size):
+            results[cnpj_normalized] = lookup['data']
+            throttled += lookup['status'] == LOOKUP_THROTTLED
         
         successful = len([r for r in results.values() if r is not None])
-        logger.info(f"✅ Busca concluída: {successful}/{len(cnpjs)} CNPJs processados com sucesso")
+        logger.info(f"✅ Busca concluída: {successful}/{len(cnpjs)} CNPJs processados com sucesso ({throttled} limitados por rate limit)")
         
         return results
\ No newline at end of file
@@ -1,15 +1,22 @@
 import csv
-import asyncio
 import logging
+from datetime import datetime
 from typing import List, Dict, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from models.reseller import Reseller, ResellerCreate, CNPJData, Coordinates
 from services.cnpj_service import CNPJService
 from services.enhanced_geocoding_service import enhanced_geocoding_service
+from services.enrichment_pipeline import build_enrichment_update
+from services.bulk_writer import BulkUpdateBuffer
+from services.reseller_upsert import compute_source_hash, build_upsert_operation
+from pymongo import UpdateOne
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# O CSV básico só traz razão social e CNPJ: são os únicos campos que o upsert incremental sobrescreve
+BASIC_CSV_FIELDS = ('name', 'cnpj')
+
 class DataEnrichmentService:
     """Service for processing CSV and enriching reseller data"""
     
@@ -17,12 +24,13 @@ class DataEnrichmentService:
         self.db = db
         self.collection = db.resellers
     
-    async def import_csv_file(self, file_path: str) -> Dict:
+    async def import_csv_file(self, file_path: str, incremental: bool = False) -> Dict:
         """
         Importa arquivo CSV com revendas
         
         Args:
             file_path: Caminho para o arquivo CSV
+            incremental: Upsert por CNPJ só das linhas alteradas, sem apagar dados já enriquecidos
             
         Returns:
             Dict com estatísticas da importação
@@ -75,6 +83,9 @@ class DataEnrichmentService:
                         errors.append(f"Linha {row_num}: {str(e)}")
                         continue
             
+            if incremental:
+                return await self._upsert_changed_resellers(resellers, errors)
+            
             # Salva no banco
             if resellers:
                 # Remove duplicatas por CNPJ
@@ -145,9 +156,6 @@ class DataEnrichmentService:
                 # Enriquece lote atual
                 enriched_count = await self._enrich_batch(batch)
                 total_enriched += enriched_count
-                
-                # Aguarda entre lotes para respeitar rate limits
-                await asyncio.sleep(1)
             
             return {
                 'success': True,
@@ -168,8 +176,9 @@ class DataEnrichmentService:
             }
     
     async def _enrich_batch(self, batch: List[Dict]) -> int:
-        """Enriquece um lote de revendas"""
-        enriched_count = 0
+        """Enriquece um lote de revendas (gravações acumuladas em um único bulk_write)"""
+        buffer = BulkUpdateBuffer(self.collection, max_operations=max(len(batch), 1))
+        enriched_ids = []
         
         for reseller_doc in batch:
             try:
@@ -185,15 +194,14 @@ class DataEnrichmentService:
                 if not cnpj_data:
                     logger.warning(f"Dados não encontrados para CNPJ: {cnpj}")
                     # Marca como processado mesmo sem dados
-                    await self.collection.update_one(
-                        {"_id": reseller_doc["_id"]},
-                        {"$set": {"data_enriched": True}}
+                    await buffer.add(
+                        UpdateOne({"_id": reseller_doc["_id"]}, {"$set": {"data_enriched": True, "updated_at": datetime.utcnow()}}),
+                        key=reseller_doc["_id"]
                     )
                     continue
                 
                 # 2. Busca coordenadas do endereço com Google Maps
-                coordinates = None
-                geocoding_source = None
+                coord_data = None
                 
                 if cnpj_data.get('endereco_completo'):
                     coord_data = await enhanced_geocoding_service.get_coordinates_from_address(
@@ -201,55 +209,60 @@ class DataEnrichmentService:
                         city=cnpj_data.get('cidade'),
                         state=cnpj_data.get('estado')
                     )
-                    
-                    if coord_data:
-                        coordinates = {
-                            'lat': coord_data['lat'],
-                            'lng': coord_data['lng']
-                        }
-                        geocoding_source = coord_data['api_source']
-                
-                # 3. Atualiza documento no banco
-                update_data = {
-                    'name': cnpj_data.get('razao_social', reseller_doc.get('name')),
-                    'address': cnpj_data.get('logradouro', '') + (f", {cnpj_data.get('numero', '')}" if cnpj_data.get('numero') else ''),
-                    'neighborhood': cnpj_data.get('bairro', ''),
-                    'city': cnpj_data.get('cidade', ''),
-                    'state': cnpj_data.get('estado', ''),
-                    'cep': cnpj_data.get('cep', ''),
-                    'phone': cnpj_data.get('telefone', ''),
-                    'cnpj_data': {
-                        'cnpj': cnpj_data['cnpj'],
-                        'razao_social': cnpj_data.get('razao_social'),
-                        'nome_fantasia': cnpj_data.get('nome_fantasia'),
-                        'atividade_principal': cnpj_data.get('atividade_principal'),
-                        'situacao': cnpj_data.get('situacao'),
-                        'telefone': cnpj_data.get('telefone'),
-                        'email': cnpj_data.get('email')
-                    },
-                    'data_enriched': True
-                }
-                
-                if coordinates:
-                    update_data['coordinates'] = coordinates
-                    update_data['geocoding_source'] = geocoding_source
                 
-                await self.collection.update_one(
-                    {"_id": reseller_doc["_id"]},
-                    {"$set": update_data}
+                # 3. Agenda a atualização do documento
+                await buffer.add(
+                    UpdateOne({"_id": reseller_doc["_id"]}, {"$set": build_enrichment_update(reseller_doc, cnpj_data, coord_data)}),
+                    key=reseller_doc["_id"]
                 )
-                
-                enriched_count += 1
+                enriched_ids.append(reseller_doc["_id"])
                 logger.info(f"✅ Revenda enriquecida: {cnpj_data.get('razao_social', cnpj)}")
                 
-                # Pausa entre requisições para respeitar rate limits
-                await asyncio.sleep(0.3)
-                
             except Exception as e:
                 logger.error(f"Erro ao enriquecer revenda {reseller_doc.get('cnpj', 'unknown')}: {str(e)}")
                 continue
         
-        return enriched_count
+        # Grava o lote e desconta as revendas cuja gravação falhou
+        failed_ids = {error['key'] for error in await buffer.close()}
+        return len([reseller_id for reseller_id in enriched_ids if reseller_id not in failed_ids])
+    
+    async def _upsert_changed_resellers(self, resellers: List[Reseller], errors: List[str]) -> Dict:
+        """Grava apenas as revendas cujo nome/CNPJ mudou desde a última importação"""
+        documents = []
+        for reseller in resellers:
+            if not reseller.cnpj:
+                continue
+            document = reseller.dict()
+            document['source_hash'] = compute_source_hash(document, BASIC_CSV_FIELDS)
+            documents.append(document)
+        
+        stored_hashes = {}
+        cursor = self.collection.find(
+            {"cnpj": {"$in": [document['cnpj'] for document in documents]}},
+            {"_id": 0, "cnpj": 1, "source_hash": 1}
+        )
+        async for doc in cursor:
+            stored_hashes[doc['cnpj']] = doc.get('source_hash')
+        
+        changed = [document for document in documents if stored_hashes.get(document['cnpj']) != document['source_hash']]
+        unchanged = len(documents) - len(changed)
+        
+        buffer = BulkUpdateBuffer(self.collection, max_operations=1000)
+        for document in changed:
+            await buffer.add(build_upsert_operation(document, BASIC_CSV_FIELDS), key=document['cnpj'])
+        write_errors = await buffer.close()
+        errors.extend(f"CNPJ {error['key']}: {error['error']}" for error in write_errors)
+        
+        total_imported = len(changed) - len(write_errors)
+        logger.info(f"✅ Importação incremental: {total_imported} revendas atualizadas, {unchanged} sem alteração")
+        
+        return {
+            'success': True,
+            'total_imported': total_imported,
+            'total_unchanged': unchanged,
+            'errors': errors,
+            'message': f'{total_imported} revendas atualizadas, {unchanged} sem alteração'
+        }
     
     async def _remove_duplicates_by_cnpj(self, cnpjs: List[str]):
         """Remove duplicatas existentes por CNPJ"""
@@ -1,57 +1,145 @@
 import math
-from typing import Tuple
+import numpy as np
+from typing import Optional, Tuple
+
+# Raio médio da Terra em quilômetros
+EARTH_RADIUS_KM = 6371.0
+
+# Quilômetros por grau de latitude, derivado do mesmo raio das distâncias: o retângulo
+# envolvente precisa conter o círculo inteiro calculado com EARTH_RADIUS_KM
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+# Até este raio a aproximação equiretangular erra bem menos que o arredondamento de 0,1 km
+EQUIRECTANGULAR_MAX_RADIUS_KM = 100.0
 
 class DistanceService:
+    @staticmethod
+    def great_circle_distance(coord1: Tuple[float, float], coord2: Tuple[float, float]) -> float:
+        """
+        Distância (sem arredondamento) entre duas coordenadas pela fórmula de Haversine, em km
+        """
+        lat1, lon1, lat2, lon2 = map(math.radians, (coord1[0], coord1[1], coord2[0], coord2[1]))
+
+        a = (math.sin((lat2 - lat1) / 2) ** 2 +
+             math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+
+        return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
     @staticmethod
     def haversine_distance(coord1: Tuple[float, float], coord2: Tuple[float, float]) -> float:
         """
         Calcula a distância entre duas coordenadas usando a fórmula de Haversine.
         Retorna a distância em quilômetros.
-        
+
         Args:
             coord1: Tupla (latitude, longitude) do primeiro ponto
             coord2: Tupla (latitude, longitude) do segundo ponto
-            
+
         Returns:
             Distância em quilômetros
         """
         try:
-            # Raio da Terra em quilômetros
-            R = 6371.0
-            
-            lat1, lon1 = coord1
-            lat2, lon2 = coord2
-            
-            # Converter graus para radianos
-            lat1_rad = math.radians(lat1)
-            lon1_rad = math.radians(lon1)
-            lat2_rad = math.radians(lat2)
-            lon2_rad = math.radians(lon2)
-            
-            # Diferenças
-            dlat = lat2_rad - lat1_rad
-            dlon = lon2_rad - lon1_rad
-            
-            # Fórmula de Haversine
-            a = (math.sin(dlat / 2) ** 2 + 
-                 math.cos(lat1_rad) * math.cos(lat2_rad) * 
-                 math.sin(dlon / 2) ** 2)
-            
-            c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-            
-            # Distância em quilômetros
-            distance = R * c
-            
-            return round(distance, 1)
-            
+            return round(DistanceService.great_circle_distance(coord1, coord2), 1)
+
         except Exception as e:
             print(f"Erro no cálculo de distância: {str(e)}")
             return float('inf')  # Retorna infinito em caso de erro
-    
+
     @staticmethod
-    def calculate_distance_from_cep(cep_coords: Tuple[float, float], 
+    def calculate_distance_from_cep(cep_coords: Tuple[float, float],
                                    reseller_coords: Tuple[float, float]) -> float:
         """
         Calcula distância entre CEP e revenda
         """
-        return DistanceService.haversine_distance(cep_coords, reseller_coords)
\ No newline at end of file
+        return DistanceService.haversine_distance(cep_coords, reseller_coords)
+
+    @staticmethod
+    def haversine_vectorized(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+        """
+        Distâncias Haversine (km) de um ponto para todos os pontos dos arrays de uma vez
+
+        Args:
+            lat, lng: Coordenadas do ponto de consulta
+            lats, lngs: Arrays float64 contíguos com as coordenadas das revendas
+        """
+        lat_rad = math.radians(lat)
+        lats_rad = np.radians(lats)
+        dlat = lats_rad - lat_rad
+        dlng = np.radians(lngs) - math.radians(lng)
+
+        a = np.sin(dlat * 0.5) ** 2 + math.cos(lat_rad) * np.cos(lats_rad) * np.sin(dlng * 0.5) ** 2
+
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    @staticmethod
+    def equirectangular_vectorized(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+        """
+        Aproximação equiretangular (km) — precisa para raios curtos e bem mais barata que Haversine
+        """
+        mean_lat = np.radians((lats + lat) * 0.5)
+        x = np.radians(lngs - lng) * np.cos(mean_lat)
+        y = np.radians(lats - lat)
+
+        return EARTH_RADIUS_KM * np.hypot(x, y)
+
+    @staticmethod
+    def bounding_box(lat: float, lng: float, radius_km: float) -> Tuple[float, float, float, float]:
+        """
+        Retângulo (min_lat, max_lat, min_lng, max_lng) que contém o círculo de raio radius_km
+        """
+        lat_delta = radius_km / KM_PER_DEGREE
+        # Longitude encolhe com a latitude; limita o cosseno para não explodir perto dos polos
+        cos_lat = max(math.cos(math.radians(min(abs(lat) + lat_delta, 89.0))), 0.01)
+        lng_delta = min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+
+        return lat - lat_delta, lat + lat_delta, lng - lng_delta, lng + lng_delta
+
+    @staticmethod
+    def bounding_box_mask(lats: np.ndarray, lngs: np.ndarray, box: Tuple[float, float, float, float]) -> np.ndarray:
+        """Máscara booleana dos pontos dentro do retângulo (pré-filtro barato antes da distância)"""
+        min_lat, max_lat, min_lng, max_lng = box
+        return (lats >= min_lat) & (lats <= max_lat) & (lngs >= min_lng) & (lngs <= max_lng)
+
+    @staticmethod
+    def distances_within(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray,
+                         radius_km: float, approximate: bool = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Posições e distâncias (km) dos pontos dentro do raio
+
+        Args:
+            lat, lng: Coordenadas do ponto de consulta
+            lats, lngs: Arrays com as coordenadas candidatas
+            radius_km: Raio máximo em km
+            approximate: Usa equiretangular; por padrão só para raios curtos
+
+        Returns:
+            Tupla (posições nos arrays de entrada, distâncias)
+        """
+        if approximate is None:
+            approximate = radius_km <= EQUIRECTANGULAR_MAX_RADIUS_KM
+
+        positions = np.flatnonzero(DistanceService.bounding_box_mask(lats, lngs, DistanceService.bounding_box(lat, lng, radius_km)))
+
+        if approximate:
+            distances = DistanceService.equirectangular_vectorized(lat, lng, lats[positions], lngs[positions])
+        else:
+            distances = DistanceService.haversine_vectorized(lat, lng, lats[positions], lngs[positions])
+
+        within = distances <= radius_km
+        return positions[within], distances[within]
+
+    @staticmethod
+    def nearest_order(distances: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+        """
+        Índices das k menores distâncias, da mais próxima à mais distante (todas se k for None)
+
+        Seleciona com np.argpartition (O(n)) e só ordena os k escolhidos; empates ficam na
+        ordem original, como num sort estável.
+        """
+        if k is None or k >= len(distances):
+            return np.argsort(distances, kind='stable')
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
+
+        selected = np.argpartition(distances, k - 1)[:k]
+        return selected[np.lexsort((selected, distances[selected]))]
@@ -1,41 +1,125 @@
-import httpx
 import asyncio
 import logging
 import googlemaps
+import requests
 import os
+import re
+import time
 from typing import Optional, Dict, Tuple
 from urllib.parse import quote
+from services.distance_service import DistanceService
+from services.http_clients import http_clients
+from services.rate_limiter import rate_limiters
+from services.single_flight import SingleFlight
+from services.retry_policy import default_retry_policy
+from services.circuit_breaker import circuit_breakers
+from services.blocking_pool import BlockingCallPool
 
 logger = logging.getLogger(__name__)
 
+class GeocodingProviderError(Exception):
+    """Falha do provedor (erro, cota, timeout) - diferente de endereço não encontrado"""
+
 class EnhancedGeocodingService:
     """Enhanced Geocoding Service using Google Maps API with OpenStreetMap fallback"""
     
     def __init__(self):
         self.google_api_key = os.environ.get('GOOGLE_MAPS_API_KEY')
-        self.gmaps = googlemaps.Client(key=self.google_api_key) if self.google_api_key else None
+        self.gmaps = None
+        self.google_session = None
+        self.google_pool = None
+        
+        if self.google_api_key:
+            # O cliente googlemaps é síncrono: roda num pool próprio, com uma sessão HTTP reutilizada
+            # (keep-alive) dimensionada para o número de threads
+            google_workers = int(os.environ.get('GOOGLE_MAPS_MAX_WORKERS', 8))
+            self.google_session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=google_workers)
+            self.google_session.mount('https://', adapter)
+            self.gmaps = googlemaps.Client(key=self.google_api_key, requests_session=self.google_session)
+            self.google_pool = BlockingCallPool(
+                'google_maps',
+                max_workers=google_workers,
+                max_queue=int(os.environ.get('GOOGLE_MAPS_MAX_QUEUE', google_workers * 4))
+            )
         
         # OpenStreetMap configs (fallback)
         self.osm_base_url = "https://nominatim.openstreetmap.org"
         self.osm_timeout = 10.0
         self.user_agent = "NacionalGas/1.0 (contato@nacionalgas.com.br)"
         
+        # Geocodificações simultâneas do mesmo endereço/CEP compartilham uma única consulta
+        self._address_lookups = SingleFlight('geocoding_endereco')
+        self._cep_lookups = SingleFlight('geocoding_cep')
+        
         logger.info(f"🗺️ Geocoding Service initialized - Google Maps: {'✅' if self.gmaps else '❌'}")
     
+    def stats(self) -> Dict:
+        """Métricas do pool do Google Maps e das consultas compartilhadas"""
+        return {
+            'google_maps_pool': self.google_pool.stats() if self.google_pool else None,
+            'address_lookups': self._address_lookups.stats(),
+            'cep_lookups': self._cep_lookups.stats()
+        }
+    
+    def close(self):
+        """Encerra o pool e a sessão HTTP do Google Maps (chamado no shutdown da aplicação)"""
+        if self.google_pool:
+            self.google_pool.shutdown()
+        if self.google_session:
+            self.google_session.close()
+    
+    @staticmethod
+    def _address_key(address: str, city: str = None, state: str = None) -> Tuple[str, str, str]:
+        """Chave normalizada do endereço (minúsculas, espaços colapsados)"""
+        return tuple(re.sub(r'\s+', ' ', (part or '').strip().lower()) for part in (address, city, state))
+    
     async def get_coordinates_from_address(self, address: str, city: str = None, state: str = None) -> Optional[Dict]:
         """
         Busca coordenadas usando Google Maps (preferencial) ou OpenStreetMap (fallback)
+        
+        Chamadas simultâneas para o mesmo endereço normalizado compartilham a mesma consulta.
         """
-        # Tenta primeiro Google Maps
+        key = self._address_key(address, city, state)
+        return await self._address_lookups.do(key, lambda: self._geocode_address(address, city, state))
+    
+    async def _geocode_address(self, address: str, city: str = None, state: str = None) -> Optional[Dict]:
+        """
+        Tenta os provedores em ordem de saúde recente (Google Maps é o preferido no empate)
+        
+        Provedores com circuit breaker aberto são pulados até o fim do cooldown.
+        """
+        providers = {}
         if self.gmaps:
-            result = await self._geocode_with_google_maps(address, city, state)
+            providers['google_maps'] = self._geocode_with_google_maps
+        providers['openstreetmap'] = self._geocode_with_osm
+        
+        for provider in circuit_breakers.order_by_health(list(providers)):
+            breaker = circuit_breakers.get(provider)
+            if not breaker.allow_request():
+                logger.info(f"⏭️ {provider} indisponível (circuit breaker {breaker.state}), pulando para: {address}")
+                continue
+            
+            started = time.monotonic()
+            recorded = False
+            try:
+                result = await providers[provider](address, city, state)
+                breaker.record_success(time.monotonic() - started)
+                recorded = True
+            except GeocodingProviderError:
+                breaker.record_failure(time.monotonic() - started)
+                recorded = True
+                logger.warning(f"{provider} falhou para: {address}")
+                continue
+            finally:
+                if not recorded:
+                    # Chamada cancelada: libera a vaga de teste do half-open
+                    breaker.release_probe()
+            
             if result:
                 return result
-            logger.warning(f"Google Maps falhou para: {address}")
         
-        # Fallback para OpenStreetMap
-        logger.info(f"Usando OpenStreetMap fallback para: {address}")
-        return await self._geocode_with_osm(address, city, state)
+        return None
     
     async def _geocode_with_google_maps(self, address: str, city: str = None, state: str = None) -> Optional[Dict]:
         """Geocoding usando Google Maps API"""
@@ -55,10 +139,11 @@ class EnhancedGeocodingService:
             
             logger.info(f"🌍 Google Maps geocoding: {full_address}")
             
-            # Executa geocoding usando googlemaps de forma síncrona (não tem versão async)
-            geocode_result = await asyncio.get_event_loop().run_in_executor(
-                None, self.gmaps.geocode, full_address
-            )
+            # Respeita o QPS configurado para o Google Maps
+            await rate_limiters.acquire('google_maps')
+            
+            # googlemaps não tem versão async: roda no pool dedicado, fora do executor padrão
+            geocode_result = await self.google_pool.run(self.gmaps.geocode, full_address)
             
             if geocode_result and len(geocode_result) > 0:
                 result_data = geocode_result[0]
@@ -83,6 +168,7 @@ class EnhancedGeocodingService:
                     
         except Exception as e:
             logger.error(f"❌ Erro Google Maps para {address}: {str(e)}")
+            raise GeocodingProviderError(str(e)) from e
         
         return None
     
@@ -113,42 +199,58 @@ class EnhancedGeocodingService:
                 'User-Agent': self.user_agent
             }
             
-            async with httpx.AsyncClient(timeout=self.osm_timeout) as client:
-                logger.info(f"🗺️ OpenStreetMap geocoding: {query}")
-                response = await client.get(url, params=params, headers=headers)
+            client = http_clients.get('nominatim')
+            logger.info(f"🗺️ OpenStreetMap geocoding: {query}")
+            # 429/5xx são repetidos com backoff (respeitando Retry-After) dentro do prazo da chamada
+            outcome = await default_retry_policy.send(
+                'nominatim',
+                lambda timeout: client.get(url, params=params, headers=headers, timeout=timeout),
+                self.osm_timeout
+            )
+            response = outcome.response
+            
+            if response is not None and response.status_code == 200:
+                data = response.json()
                 
-                if response.status_code == 200:
-                    data = response.json()
+                if data and len(data) > 0:
+                    result_data = data[0]
+                    
+                    lat = float(result_data.get('lat'))
+                    lng = float(result_data.get('lon'))
+                    
+                    address_details = result_data.get('address', {})
                     
-                    if data and len(data) > 0:
-                        result_data = data[0]
-                        
-                        lat = float(result_data.get('lat'))
-                        lng = float(result_data.get('lon'))
-                        
-                        address_details = result_data.get('address', {})
-                        
-                        result = {
-                            'lat': lat,
-                            'lng': lng,
-                            'formatted_address': result_data.get('display_name', ''),
-                            'address_details': {
-                                'road': address_details.get('road', ''),
-                                'house_number': address_details.get('house_number', ''),
-                                'suburb': address_details.get('suburb', ''),
-                                'city': address_details.get('city', address_details.get('town', '')),
-                                'state': address_details.get('state', ''),
-                                'postcode': address_details.get('postcode', ''),
-                                'country': address_details.get('country', '')
-                            },
-                            'api_source': 'openstreetmap'
-                        }
-                        
-                        logger.info(f"✅ OpenStreetMap: {lat}, {lng}")
-                        return result
-                        
+                    result = {
+                        'lat': lat,
+                        'lng': lng,
+                        'formatted_address': result_data.get('display_name', ''),
+                        'address_details': {
+                            'road': address_details.get('road', ''),
+                            'house_number': address_details.get('house_number', ''),
+                            'suburb': address_details.get('suburb', ''),
+                            'city': address_details.get('city', address_details.get('town', '')),
+                            'state': address_details.get('state', ''),
+                            'postcode': address_details.get('postcode', ''),
+                            'country': address_details.get('country', '')
+                        },
+                        'api_source': 'openstreetmap'
+                    }
+                    
+                    logger.info(f"✅ OpenStreetMap: {lat}, {lng}")
+                    return result
+            
+            elif outcome.throttled:
+                logger.warning(f"Rate limit excedido no OpenStreetMap para: {query}")
+                raise GeocodingProviderError(outcome.error)
+            
+            elif response is None or response.status_code >= 500:
+                raise GeocodingProviderError(outcome.error or f"HTTP {response.status_code}")
+                    
+        except GeocodingProviderError:
+            raise
         except Exception as e:
             logger.error(f"❌ Erro OpenStreetMap para {address}: {str(e)}")
+            raise GeocodingProviderError(str(e)) from e
         
         return None
     
@@ -200,17 +302,19 @@ class EnhancedGeocodingService:
             # Formata CEP
             cep_formatted = f"{cep_clean[:5]}-{cep_clean[5:]}"
             
-            # Busca usando CEP como endereço
-            return await self.get_coordinates_from_address(f"{cep_formatted}, Brasil")
+            # Busca usando CEP como endereço (uma consulta por CEP entre chamadores simultâneos)
+            return await self._cep_lookups.do(
+                cep_clean, lambda: self.get_coordinates_from_address(f"{cep_formatted}, Brasil")
+            )
             
         except Exception as e:
             logger.error(f"Erro na busca por CEP {cep}: {str(e)}")
             return None
     
-    async def batch_geocode_addresses(self, addresses: list, batch_size: int = 5, delay: float = 0.1) -> Dict[str, Dict]:
+    async def batch_geocode_addresses(self, addresses: list, batch_size: int = 5) -> Dict[str, Dict]:
         """
         Geocodifica múltiplos endereços em lote
-        Google Maps permite mais requests por segundo que OpenStreetMap
+        O ritmo de cada provedor (Google Maps, OpenStreetMap) é controlado pelos rate limiters
         """
         results = {}
         
@@ -243,10 +347,6 @@ class EnhancedGeocodingService:
                     results[addr_key] = None
                 else:
                     results[addr_key] = result
-            
-            # Pausa entre lotes (menor para Google Maps)
-            if i + batch_size < len(addresses):
-                await asyncio.sleep(delay)
         
         successful = len([r for r in results.values() if r is not None])
         google_maps_count = len([r for r in results.values() if r and r.get('api_source') == 'google_maps'])
@@ -262,24 +362,7 @@ class EnhancedGeocodingService:
         """
         Calcula distância entre duas coordenadas usando fórmula Haversine
         """
-        import math
-        
-        lat1, lng1 = coord1
-        lat2, lng2 = coord2
-        
-        # Converte para radianos
-        lat1, lng1, lat2, lng2 = map(math.radians, [lat1, lng1, lat2, lng2])
-        
-        # Fórmula Haversine
-        dlat = lat2 - lat1
-        dlng = lng2 - lng1
-        a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng/2)**2
-        c = 2 * math.asin(math.sqrt(a))
-        
-        # Raio da Terra em km
-        r = 6371
-        
-        return c * r
+        return DistanceService.great_circle_distance(coord1, coord2)
 
 # Instância global para ser usada pelos serviços
 enhanced_geocoding_service = EnhancedGeocodingService()
\ No newline at end of file
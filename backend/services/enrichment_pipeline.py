@@ -0,0 +1,207 @@
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Dict, Optional
+from services.cnpj_service import CNPJService, LOOKUP_FOUND, LOOKUP_NOT_FOUND, LOOKUP_THROTTLED
+from services.enhanced_geocoding_service import enhanced_geocoding_service
+from services.reseller_service import ResellerService
+from services.bulk_writer import BulkUpdateBuffer
+from services.enrichment_state import success_state, failure_state
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Sinaliza o fim de uma fila para os workers do estágio seguinte
+_STAGE_DONE = object()
+
+
+def build_enrichment_update(reseller_doc: Dict, cnpj_data: Dict, coord_data: Optional[Dict]) -> Dict:
+    """Monta o $set de uma revenda a partir dos dados da BrasilAPI e do geocoding"""
+    update_data = {
+        'name': cnpj_data.get('razao_social', reseller_doc.get('name', '')),
+        'address': cnpj_data.get('logradouro', '') + (f", {cnpj_data.get('numero', '')}" if cnpj_data.get('numero') else ''),
+        'neighborhood': cnpj_data.get('bairro', ''),
+        'city': cnpj_data.get('cidade', ''),
+        'state': cnpj_data.get('estado', ''),
+        'cep': cnpj_data.get('cep', ''),
+        'phone': cnpj_data.get('telefone', ''),
+        'cnpj_data': {
+            'cnpj': cnpj_data['cnpj'],
+            'razao_social': cnpj_data.get('razao_social'),
+            'nome_fantasia': cnpj_data.get('nome_fantasia'),
+            'atividade_principal': cnpj_data.get('atividade_principal'),
+            'situacao': cnpj_data.get('situacao'),
+            'telefone': cnpj_data.get('telefone'),
+            'email': cnpj_data.get('email')
+        },
+        'data_enriched': True,
+        'updated_at': datetime.utcnow()
+    }
+
+    # Adiciona coordenadas se encontradas
+    if coord_data:
+        update_data['coordinates'] = {
+            'lat': coord_data['lat'],
+            'lng': coord_data['lng']
+        }
+        update_data['location'] = ResellerService.build_location(update_data['coordinates'])
+        update_data['geocoding_source'] = coord_data['api_source']
+
+    return update_data
+
+
+class EnrichmentPipeline:
+    """
+    Pipeline de enriquecimento em três estágios (CNPJ -> geocoding -> gravação)
+
+    Os estágios são ligados por filas limitadas: todos trabalham ao mesmo tempo e um estágio
+    lento segura os anteriores (backpressure) em vez de acumular resultados em memória.
+    Cada revenda termina com seu enrichment_state gravado (sucesso ou falha com backoff).
+    """
+
+    def __init__(self, collection, cnpj_concurrency: int = None, geocode_concurrency: int = None, queue_size: int = None, stats: Dict = None, run_id: str = None):
+        self.collection = collection
+        self.run_id = run_id
+        self.cnpj_concurrency = cnpj_concurrency or int(os.environ.get('ENRICH_CNPJ_CONCURRENCY', 5))
+        self.geocode_concurrency = geocode_concurrency or int(os.environ.get('ENRICH_GEOCODE_CONCURRENCY', 5))
+        self.queue_size = queue_size or int(os.environ.get('ENRICH_QUEUE_SIZE', 50))
+
+        # `stats` pode ser um dict externo (ex.: progresso de uma tarefa em segundo plano)
+        self.stats = stats if stats is not None else {}
+        for counter in ('processed', 'enriched', 'not_found', 'throttled', 'failed'):
+            self.stats.setdefault(counter, 0)
+
+    async def run(self, reseller_docs: List[Dict]) -> Dict:
+        """
+        Enriquece as revendas informadas
+
+        Returns:
+            Dict com processed, enriched, not_found, throttled e failed
+        """
+        resellers_by_cnpj = {}
+        for reseller_doc in reseller_docs:
+            if reseller_doc.get('cnpj'):
+                resellers_by_cnpj[CNPJService.normalize_cnpj(reseller_doc['cnpj'])] = reseller_doc
+
+        if not resellers_by_cnpj:
+            return self.stats
+
+        geocode_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        write_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+
+        logger.info(
+            f"🏭 Pipeline de enriquecimento: {len(resellers_by_cnpj)} revendas "
+            f"(CNPJ x{self.cnpj_concurrency}, geocoding x{self.geocode_concurrency})"
+        )
+
+        geocoders = [asyncio.create_task(self._geocode_stage(geocode_queue, write_queue)) for _ in range(self.geocode_concurrency)]
+        writer = asyncio.create_task(self._write_stage(write_queue))
+
+        try:
+            await self._fetch_stage(resellers_by_cnpj, geocode_queue, write_queue)
+            await asyncio.gather(*geocoders)
+        finally:
+            for task in geocoders:
+                task.cancel()
+            # Também no cancelamento: o gravador grava o que já está na fila e nos buffers antes
+            # de terminar, e só então o cancelamento segue para quem chamou
+            if not writer.done():
+                await write_queue.put(_STAGE_DONE)
+            await writer
+
+        logger.info(f"✅ Pipeline concluído: {self.stats}")
+        return self.stats
+
+    async def _fetch_stage(self, resellers_by_cnpj: Dict[str, Dict], geocode_queue: asyncio.Queue, write_queue: asyncio.Queue):
+        """Estágio 1: consulta os CNPJs e repassa cada resultado assim que chega"""
+        async for cnpj, lookup in CNPJService.stream_companies_data(resellers_by_cnpj.keys(), concurrency=self.cnpj_concurrency):
+            self.stats['processed'] += 1
+
+            if lookup['status'] == LOOKUP_FOUND:
+                await geocode_queue.put((resellers_by_cnpj[cnpj], lookup['data']))
+                continue
+
+            if lookup['status'] == LOOKUP_THROTTLED:
+                # Limitação temporária do provedor: não conta como tentativa da revenda
+                self.stats['throttled'] += 1
+                continue
+
+            if lookup['status'] == LOOKUP_NOT_FOUND:
+                self.stats['not_found'] += 1
+                error = 'CNPJ não encontrado'
+            else:
+                self.stats['failed'] += 1
+                error = lookup.get('error') or 'Erro na consulta do CNPJ'
+
+            # Registra a falha direto no estágio de gravação (sem geocoding)
+            await write_queue.put((resellers_by_cnpj[cnpj], None, error))
+
+        for _ in range(self.geocode_concurrency):
+            await geocode_queue.put(_STAGE_DONE)
+
+    async def _geocode_stage(self, geocode_queue: asyncio.Queue, write_queue: asyncio.Queue):
+        """Estágio 2: geocodifica o endereço retornado pela BrasilAPI"""
+        while True:
+            item = await geocode_queue.get()
+            if item is _STAGE_DONE:
+                return
+
+            reseller_doc, cnpj_data = item
+            coord_data = None
+
+            if cnpj_data.get('endereco_completo'):
+                try:
+                    coord_data = await enhanced_geocoding_service.get_coordinates_from_address(
+                        address=cnpj_data['endereco_completo'],
+                        city=cnpj_data.get('cidade', ''),
+                        state=cnpj_data.get('estado', '')
+                    )
+                except Exception as e:
+                    logger.error(f"Erro no geocoding do CNPJ {cnpj_data.get('cnpj')}: {str(e)}")
+
+            await write_queue.put((reseller_doc, cnpj_data, coord_data))
+
+    async def _write_stage(self, write_queue: asyncio.Queue):
+        """Estágio 3: acumula as atualizações e grava em bulk_write"""
+        buffer = BulkUpdateBuffer(self.collection)
+        # Falhas vão num buffer separado para não contarem como revendas enriquecidas
+        failure_buffer = BulkUpdateBuffer(self.collection)
+        enriched_before = self.stats['enriched']
+
+        try:
+            while True:
+                item = await write_queue.get()
+                if item is _STAGE_DONE:
+                    break
+
+                reseller_doc, cnpj_data, coord_data = item
+                if not cnpj_data:
+                    # Falha na consulta: o terceiro elemento é a mensagem de erro
+                    await failure_buffer.add(
+                        UpdateOne({"_id": reseller_doc["_id"]}, {"$set": {
+                            'enrichment_state': failure_state(reseller_doc, coord_data, self.run_id)
+                        }}),
+                        key=reseller_doc.get('cnpj')
+                    )
+                    continue
+
+                try:
+                    update_data = build_enrichment_update(reseller_doc, cnpj_data, coord_data)
+                    update_data['enrichment_state'] = success_state(reseller_doc, self.run_id)
+                    await buffer.add(
+                        UpdateOne({"_id": reseller_doc["_id"]}, {"$set": update_data}),
+                        key=cnpj_data.get('cnpj')
+                    )
+                except Exception as e:
+                    logger.error(f"Erro ao enriquecer revenda {cnpj_data.get('cnpj')}: {str(e)}")
+                    self.stats['failed'] += 1
+
+                # Mantém o progresso visível a cada lote gravado
+                self.stats['enriched'] = enriched_before + buffer.succeeded
+        finally:
+            # Inclusive se cancelado: grava as atualizações pendentes antes de sair
+            await failure_buffer.close()
+            errors = await buffer.close()
+            self.stats['enriched'] = enriched_before + buffer.succeeded
+            self.stats['failed'] += len(errors)
@@ -0,0 +1,140 @@
+import os
+import uuid
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+logger = logging.getLogger(__name__)
+
+# Backoff exponencial entre tentativas de enriquecimento da mesma revenda
+BACKOFF_BASE_MINUTES = float(os.environ.get('ENRICH_BACKOFF_BASE_MINUTES', 60))
+BACKOFF_MAX_HOURS = float(os.environ.get('ENRICH_BACKOFF_MAX_HOURS', 24 * 7))
+
+# Contadores de progresso persistidos em cada checkpoint da execução
+RUN_COUNTERS = ('processed', 'enriched', 'not_found', 'throttled', 'failed')
+
+
+def next_eligible_at(attempts: int, now: datetime = None) -> datetime:
+    """Próxima tentativa após `attempts` falhas: base * 2^(attempts-1), limitado a BACKOFF_MAX_HOURS"""
+    now = now or datetime.utcnow()
+    delay_minutes = BACKOFF_BASE_MINUTES * (2 ** max(attempts - 1, 0))
+    return now + min(timedelta(minutes=delay_minutes), timedelta(hours=BACKOFF_MAX_HOURS))
+
+
+def success_state(reseller_doc: Dict, run_id: Optional[str]) -> Dict:
+    """enrichment_state de uma revenda enriquecida com sucesso"""
+    previous = reseller_doc.get('enrichment_state') or {}
+    return {
+        'status': 'enriched',
+        'attempts': previous.get('attempts', 0) + 1,
+        'last_error': None,
+        'last_attempt_at': datetime.utcnow(),
+        'next_eligible_at': None,
+        'last_run_id': run_id
+    }
+
+
+def failure_state(reseller_doc: Dict, error: str, run_id: Optional[str]) -> Dict:
+    """enrichment_state de uma revenda que falhou (fica fora das execuções até o backoff expirar)"""
+    previous = reseller_doc.get('enrichment_state') or {}
+    attempts = previous.get('attempts', 0) + 1
+    now = datetime.utcnow()
+    return {
+        'status': 'failed',
+        'attempts': attempts,
+        'last_error': error,
+        'last_attempt_at': now,
+        'next_eligible_at': next_eligible_at(attempts, now),
+        'last_run_id': run_id
+    }
+
+
+def eligible_filter(now: datetime = None) -> Dict:
+    """Filtro das revendas que não estão aguardando backoff"""
+    now = now or datetime.utcnow()
+    return {
+        "$or": [
+            {"enrichment_state.next_eligible_at": {"$exists": False}},
+            {"enrichment_state.next_eligible_at": None},
+            {"enrichment_state.next_eligible_at": {"$lte": now}}
+        ]
+    }
+
+
+class EnrichmentRunStore:
+    """
+    Checkpoints das execuções de enriquecimento (coleção enrichment_runs)
+
+    Cada execução guarda as revendas selecionadas e os contadores de progresso. Uma execução que
+    ficou 'running' sem checkpoint recente foi interrompida (ex.: restart do servidor) e é retomada.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, stale_seconds: float = None):
+        self.collection = db.enrichment_runs
+        self.resellers = db.resellers
+        self.stale_seconds = stale_seconds or float(os.environ.get('ENRICH_RUN_STALE_SECONDS', 60))
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("status", 1), ("updated_at", -1)])
+        await self.resellers.create_index("enrichment_state.next_eligible_at")
+
+    async def create(self, reseller_ids: List) -> Dict:
+        now = datetime.utcnow()
+        run = {
+            '_id': str(uuid.uuid4()),
+            'status': 'running',
+            'reseller_ids': reseller_ids,
+            'total': len(reseller_ids),
+            'started_at': now,
+            'updated_at': now,
+            'finished_at': None,
+            **{counter: 0 for counter in RUN_COUNTERS}
+        }
+        await self.collection.insert_one(run)
+        return run
+
+    async def find_interrupted(self) -> Optional[Dict]:
+        """
+        Execução mais recente que parou sem concluir: interrompida por um shutdown ou sem
+        checkpoint há mais de stale_seconds (ex.: processo derrubado)
+        """
+        stale_before = datetime.utcnow() - timedelta(seconds=self.stale_seconds)
+        return await self.collection.find_one(
+            {"status": "running", "$or": [{"interrupted": True}, {"updated_at": {"$lt": stale_before}}]},
+            sort=[("updated_at", -1)]
+        )
+
+    async def claim(self, run: Dict) -> bool:
+        """Assume uma execução interrompida (evita que dois processos retomem a mesma)"""
+        result = await self.collection.update_one(
+            {"_id": run['_id'], "status": "running", "updated_at": run['updated_at']},
+            {"$set": {"updated_at": datetime.utcnow(), "interrupted": False}, "$inc": {"resumed": 1}}
+        )
+        return result.modified_count == 1
+
+    async def checkpoint(self, run_id: str, stats: Dict, interrupted: bool = False):
+        """
+        Grava o progresso; com interrupted=True (shutdown) a execução fica 'running' e pode ser
+        retomada logo no próximo start, sem esperar stale_seconds
+        """
+        await self.collection.update_one(
+            {"_id": run_id},
+            {"$set": {
+                **{counter: stats.get(counter, 0) for counter in RUN_COUNTERS},
+                'updated_at': datetime.utcnow(),
+                'interrupted': interrupted
+            }}
+        )
+
+    async def finish(self, run_id: str, status: str, stats: Dict):
+        now = datetime.utcnow()
+        await self.collection.update_one(
+            {"_id": run_id},
+            {"$set": {
+                **{counter: stats.get(counter, 0) for counter in RUN_COUNTERS},
+                'status': status,
+                'updated_at': now,
+                'finished_at': now
+            }}
+        )
@@ -3,6 +3,9 @@ import asyncio
 import logging
 from typing import Optional, Dict, Tuple
 from urllib.parse import quote
+from services.distance_service import DistanceService
+from services.http_clients import http_clients
+from services.rate_limiter import rate_limiters
 
 logger = logging.getLogger(__name__)
 
@@ -57,54 +60,55 @@ class GeocodingService:
                 'User-Agent': GeocodingService.USER_AGENT
             }
             
-            async with httpx.AsyncClient(timeout=GeocodingService.TIMEOUT) as client:
-                logger.info(f"Buscando coordenadas para: {query}")
-                response = await client.get(url, params=params, headers=headers)
+            client = http_clients.get('nominatim')
+            await rate_limiters.acquire('nominatim')
+            logger.info(f"Buscando coordenadas para: {query}")
+            response = await client.get(url, params=params, headers=headers, timeout=GeocodingService.TIMEOUT)
+            
+            if response.status_code == 200:
+                data = response.json()
                 
-                if response.status_code == 200:
-                    data = response.json()
+                if data and len(data) > 0:
+                    result_data = data[0]
                     
-                    if data and len(data) > 0:
-                        result_data = data[0]
-                        
-                        # Extrai coordenadas
-                        lat = float(result_data.get('lat'))
-                        lng = float(result_data.get('lon'))
-                        
-                        # Extrai detalhes do endereço
-                        address_details = result_data.get('address', {})
-                        
-                        result = {
-                            'lat': lat,
-                            'lng': lng,
-                            'display_name': result_data.get('display_name', ''),
-                            'address_details': {
-                                'road': address_details.get('road', ''),
-                                'house_number': address_details.get('house_number', ''),
-                                'suburb': address_details.get('suburb', ''),
-                                'city': address_details.get('city', address_details.get('town', address_details.get('village', ''))),
-                                'state': address_details.get('state', ''),
-                                'postcode': address_details.get('postcode', ''),
-                                'country': address_details.get('country', '')
-                            },
-                            'importance': result_data.get('importance', 0),
-                            'api_source': 'nominatim'
-                        }
-                        
-                        logger.info(f"✅ Coordenadas encontradas: {lat}, {lng}")
-                        return result
-                    else:
-                        logger.warning(f"Nenhuma coordenada encontrada para: {query}")
-                        return None
-                        
-                elif response.status_code == 429:
-                    logger.warning(f"Rate limit excedido para endereço: {query}")
-                    await asyncio.sleep(1)
-                    return None
+                    # Extrai coordenadas
+                    lat = float(result_data.get('lat'))
+                    lng = float(result_data.get('lon'))
+                    
+                    # Extrai detalhes do endereço
+                    address_details = result_data.get('address', {})
+                    
+                    result = {
+                        'lat': lat,
+                        'lng': lng,
+                        'display_name': result_data.get('display_name', ''),
+                        'address_details': {
+                            'road': address_details.get('road', ''),
+                            'house_number': address_details.get('house_number', ''),
+                            'suburb': address_details.get('suburb', ''),
+                            'city': address_details.get('city', address_details.get('town', address_details.get('village', ''))),
+                            'state': address_details.get('state', ''),
+                            'postcode': address_details.get('postcode', ''),
+                            'country': address_details.get('country', '')
+                        },
+                        'importance': result_data.get('importance', 0),
+                        'api_source': 'nominatim'
+                    }
+                    
+                    logger.info(f"✅ Coordenadas encontradas: {lat}, {lng}")
+                    return result
                 else:
-                    logger.error(f"Erro na geocodificação: {response.status_code}")
+                    logger.warning(f"Nenhuma coordenada encontrada para: {query}")
                     return None
                     
+            elif response.status_code == 429:
+                logger.warning(f"Rate limit excedido para endereço: {query}")
+                rate_limiters.pause('nominatim', 1.0)
+                return None
+            else:
+                logger.error(f"Erro na geocodificação: {response.status_code}")
+                return None
+                
         except httpx.TimeoutException:
             logger.error(f"Timeout na geocodificação: {address}")
             return None
@@ -144,15 +148,14 @@ class GeocodingService:
             return None
     
     @staticmethod
-    async def batch_geocode_addresses(addresses: list, batch_size: int = 3, delay: float = 1.0) -> Dict[str, Dict]:
+    async def batch_geocode_addresses(addresses: list, batch_size: int = 3) -> Dict[str, Dict]:
         """
         Geocodifica múltiplos endereços em lote com controle de rate limit
-        OpenStreetMap tem rate limit mais restritivo (1 req/seg)
+        OpenStreetMap tem rate limit mais restritivo (1 req/seg), aplicado pelo rate limiter do Nominatim
         
         Args:
             addresses: Lista de endereços
             batch_size: Número de requisições simultâneas (recomendado: 3)
-            delay: Delay entre lotes (segundos, recomendado: 1.0)
             
         Returns:
             Dict com endereço como chave e coordenadas como valor
@@ -190,10 +193,6 @@ class GeocodingService:
                     results[addr_key] = None
                 else:
                     results[addr_key] = result
-            
-            # Aguarda antes do próximo lote (respeitando rate limit)
-            if i + batch_size < len(addresses):
-                await asyncio.sleep(delay)
         
         successful = len([r for r in results.values() if r is not None])
         logger.info(f"✅ Geocodificação concluída: {successful}/{len(addresses)} endereços processados com sucesso")
@@ -212,21 +211,4 @@ class GeocodingService:
         Returns:
             Distância em quilômetros
         """
-        import math
-        
-        lat1, lng1 = coord1
-        lat2, lng2 = coord2
-        
-        # Converte para radianos
-        lat1, lng1, lat2, lng2 = map(math.radians, [lat1, lng1, lat2, lng2])
-        
-        # Fórmula Haversine
-        dlat = lat2 - lat1
-        dlng = lng2 - lng1
-        a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng/2)**2
-        c = 2 * math.asin(math.sqrt(a))
-        
-        # Raio da Terra em km
-        r = 6371
-        
-        return c * r
\ No newline at end of file
+        return DistanceService.great_circle_distance(coord1, coord2)
\ No newline at end of file
@@ -0,0 +1,57 @@
+import os
+import logging
+import importlib.util
+import httpx
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+class HTTPClientManager:
+    """Clientes httpx.AsyncClient compartilhados (um por provedor) com pool de conexões e keep-alive"""
+
+    def __init__(self):
+        self.max_connections = int(os.environ.get('HTTP_POOL_MAX_CONNECTIONS', 20))
+        self.max_keepalive_connections = int(os.environ.get('HTTP_POOL_MAX_KEEPALIVE', 10))
+        self.keepalive_expiry = float(os.environ.get('HTTP_POOL_KEEPALIVE_EXPIRY', 30.0))
+        self.timeout = float(os.environ.get('HTTP_CLIENT_TIMEOUT', 10.0))
+
+        # HTTP/2 depende do pacote opcional 'h2'
+        http2_requested = os.environ.get('HTTP_CLIENT_HTTP2', 'true').lower() == 'true'
+        self.http2 = http2_requested and importlib.util.find_spec('h2') is not None
+        if http2_requested and not self.http2:
+            logger.info("Pacote 'h2' não instalado: clientes HTTP usando HTTP/1.1")
+
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def get(self, provider: str) -> httpx.AsyncClient:
+        """
+        Cliente do provedor ('brasilapi', 'nominatim', ...), criado no primeiro uso
+
+        O timeout de cada provedor é passado por requisição.
+        """
+        client = self._clients.get(provider)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                http2=self.http2,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry
+                )
+            )
+            self._clients[provider] = client
+            logger.info(f"🔌 Cliente HTTP criado para {provider} (HTTP/2: {'✅' if self.http2 else '❌'})")
+        return client
+
+    async def aclose(self):
+        """Fecha todos os clientes (chamado no shutdown da aplicação)"""
+        for provider, client in list(self._clients.items()):
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"Erro ao fechar cliente HTTP de {provider}: {str(e)}")
+        self._clients.clear()
+
+# Instância global usada pelos serviços que chamam provedores externos
+http_clients = HTTPClientManager()
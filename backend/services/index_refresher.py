@@ -0,0 +1,307 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from pymongo.errors import OperationFailure, PyMongoError
+from services.reseller_snapshot import entry_from_document, SNAPSHOT_PROJECTION
+from services.snapshot_store import SnapshotStore
+
+logger = logging.getLogger(__name__)
+
+# Operações do change stream que exigem recarregar o índice inteiro
+_RELOAD_OPERATIONS = ('drop', 'rename', 'dropDatabase', 'invalidate')
+
+# Código do MongoDB para change streams indisponíveis (servidor standalone, sem replica set)
+_CHANGE_STREAMS_UNSUPPORTED = 40573
+
+
+class ResellerIndexRefresher:
+    """
+    Mantém o índice espacial em memória em dia com a coleção resellers
+
+    Segue a coleção por change stream (replica set) ou, quando indisponível, consulta
+    periodicamente as revendas com updated_at acima da marca d'água. As alterações são
+    acumuladas em lotes e aplicadas num novo snapshot, que substitui o atual de uma vez:
+    a busca nunca vê um índice pela metade.
+
+    Com um SnapshotStore, a carga inicial parte do snapshot em disco e só busca no MongoDB
+    o que mudou desde a marca d'água dele; o snapshot é regravado a cada snapshot_interval
+    segundos quando houve alterações.
+    """
+
+    def __init__(self, reseller_service, batch_size: int = None, max_delay: float = None,
+                 poll_interval: float = None, poll_overlap: float = None,
+                 snapshot_store: Optional[SnapshotStore] = None, snapshot_interval: float = None):
+        self.reseller_service = reseller_service
+        self.collection = reseller_service.collection
+        self.batch_size = batch_size or int(os.environ.get('INDEX_REFRESH_BATCH_SIZE', 500))
+        self.max_delay = max_delay or float(os.environ.get('INDEX_REFRESH_MAX_DELAY', 1.0))
+        self.poll_interval = poll_interval or float(os.environ.get('INDEX_REFRESH_POLL_INTERVAL', 5.0))
+        # Sobreposição da janela do polling: cobre gravações com updated_at anterior ao commit
+        self.poll_overlap = timedelta(seconds=poll_overlap or float(os.environ.get('INDEX_REFRESH_POLL_OVERLAP', 5.0)))
+
+        if snapshot_store is None and os.environ.get('INDEX_SNAPSHOT_ENABLED', 'true').lower() == 'true':
+            snapshot_store = SnapshotStore()
+        self.snapshot_store = snapshot_store
+        self.snapshot_interval = snapshot_interval or float(os.environ.get('INDEX_SNAPSHOT_INTERVAL', 300))
+
+        self.mode: Optional[str] = None
+        self.watermark: Optional[datetime] = None
+        self.applied_changes = 0
+        self.full_reloads = 0
+        self.last_refresh_at: Optional[datetime] = None
+        self.loaded_from_disk = False
+
+        self._snapshot_dirty = False
+        self._snapshot_saved_at = 0.0
+        self._pending: Dict[str, Optional[Dict]] = {}
+        self._polled_versions: Dict[str, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Carrega o índice e passa a acompanhar a coleção em segundo plano"""
+        # Usado pela recuperação do atraso a partir do snapshot em disco e pelo polling
+        await self.collection.create_index("updated_at")
+        
+        try:
+            stream = await self._open_and_load(from_disk=True)
+        except OperationFailure as e:
+            if e.code == _CHANGE_STREAMS_UNSUPPORTED:
+                logger.info("MongoDB sem replica set: índice atualizado por polling de updated_at")
+            else:
+                logger.warning(f"Change stream indisponível ({str(e)}), usando polling por updated_at")
+            await self._start_polling()
+            return
+
+        self.mode = 'change_stream'
+        self._task = asyncio.create_task(self._follow(stream))
+        logger.info("🔄 Índice em memória acompanhando a coleção por change stream")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Alterações ainda não gravadas vão para o disco no shutdown
+        await self._save_snapshot(force=self._snapshot_dirty)
+
+    def _watch(self, resume_after: Dict = None):
+        return self.collection.watch(
+            full_document='updateLookup',
+            resume_after=resume_after,
+            max_await_time_ms=int(self.max_delay * 1000)
+        )
+
+    async def _reload(self):
+        loaded_at = datetime.utcnow()
+        await self.reseller_service.load_spatial_index()
+        self._pending.clear()
+        self.full_reloads += 1
+        self.watermark = self.last_refresh_at = loaded_at
+        self._polled_versions = {}
+        await self._save_snapshot(force=True)
+
+    async def _load_initial(self):
+        """Carga inicial: snapshot em disco mais as alterações desde a marca d'água dele, ou a coleção inteira"""
+        stored = None
+        if self.snapshot_store:
+            stored = await asyncio.get_running_loop().run_in_executor(None, self.snapshot_store.load)
+
+        if stored is None:
+            await self._reload()
+            return
+
+        snapshot, manifest = stored
+        self.reseller_service.set_index_snapshot(snapshot)
+        self.watermark = manifest['watermark']
+        self._snapshot_saved_at = asyncio.get_running_loop().time()
+        self.loaded_from_disk = True
+
+        caught_up = await self._poll_once()
+        logger.info(
+            f"💾 Índice carregado do snapshot em disco ({manifest['count']} revendas, "
+            f"{caught_up} alterações desde {manifest['watermark']:%Y-%m-%d %H:%M:%S})"
+        )
+
+    async def _save_snapshot(self, force: bool):
+        """Grava o snapshot atual em disco (se houve alterações e passou o intervalo, ou se forçado)"""
+        if not self.snapshot_store:
+            return
+        loop = asyncio.get_running_loop()
+        if not force and (not self._snapshot_dirty or loop.time() - self._snapshot_saved_at < self.snapshot_interval):
+            return
+
+        snapshot, watermark = self.reseller_service.spatial_index.snapshot, self.watermark
+        try:
+            await loop.run_in_executor(None, self.snapshot_store.save, snapshot, watermark)
+        except OSError as e:
+            logger.error(f"Erro ao gravar snapshot do índice: {str(e)}")
+            return
+        self._snapshot_dirty = False
+        self._snapshot_saved_at = loop.time()
+
+    def _flush(self) -> int:
+        if not self._pending:
+            return 0
+        changes, self._pending = self._pending, {}
+        self.reseller_service.apply_index_changes(changes)
+        self.applied_changes += len(changes)
+        self.last_refresh_at = datetime.utcnow()
+        self._snapshot_dirty = True
+        logger.info(f"🔄 Índice em memória: {len(changes)} alterações aplicadas ({len(self.reseller_service.spatial_index)} revendas)")
+        return len(changes)
+
+    # Change stream
+
+    def _on_change(self, change: Dict) -> bool:
+        """Acumula um evento; retorna True quando o índice precisa ser recarregado inteiro"""
+        operation = change['operationType']
+        if operation in _RELOAD_OPERATIONS:
+            return True
+
+        key = str(change['documentKey']['_id'])
+        if operation == 'delete':
+            self._pending[key] = None
+        elif operation in ('insert', 'update', 'replace'):
+            document = change.get('fullDocument')
+            # fullDocument ausente: o documento foi removido depois da alteração
+            self._pending[key] = entry_from_document(document) if document else None
+        return False
+
+    async def _open_and_load(self, from_disk: bool = False):
+        """Abre um change stream e carrega o índice (do snapshot em disco ou da coleção inteira)"""
+        stream = self._watch()
+        # O cursor é aberto antes da carga: nada gravado durante a carga é perdido
+        first_change = await stream.try_next()
+        if from_disk:
+            await self._load_initial()
+        else:
+            await self._reload()
+        if first_change and self._on_change(first_change):
+            self._pending.clear()
+        return stream
+
+    async def _consume(self, stream):
+        """Aplica os eventos em lotes; retorna quando o índice precisa ser recarregado inteiro"""
+        loop = asyncio.get_running_loop()
+        first_pending_at = loop.time()
+
+        async with stream:
+            while True:
+                change = await stream.try_next()
+                if change is not None:
+                    if not self._pending:
+                        first_pending_at = loop.time()
+                    if self._on_change(change):
+                        logger.warning(f"Change stream: '{change['operationType']}', recarregando o índice")
+                        return
+
+                if self._pending and (change is None or len(self._pending) >= self.batch_size
+                                      or loop.time() - first_pending_at >= self.max_delay):
+                    # Eventos entregues até aqui: a marca d'água do snapshot em disco
+                    applied_until = datetime.utcnow()
+                    self._flush()
+                    self.watermark = applied_until
+
+                await self._save_snapshot(force=False)
+
+    async def _follow(self, stream):
+        while True:
+            resume_token = None
+            try:
+                await self._consume(stream)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                # Ex.: histórico do oplog perdido - não dá para retomar, recarrega tudo
+                logger.warning(f"Change stream falhou ({str(e)}), recarregando o índice")
+            except PyMongoError as e:
+                # Falha de conexão/eleição: retoma do último evento entregue
+                resume_token = stream.resume_token
+                logger.warning(f"Change stream interrompido ({str(e)}), reabrindo")
+                await asyncio.sleep(1.0)
+
+            stream = await self._reopen(resume_token)
+
+    async def _reopen(self, resume_token: Optional[Dict]):
+        """Reabre o stream retomando do token ou, sem token, recarregando o índice inteiro"""
+        while True:
+            try:
+                if resume_token is not None:
+                    return self._watch(resume_after=resume_token)
+                return await self._open_and_load()
+            except PyMongoError as e:
+                logger.error(f"Erro ao reabrir o change stream: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+
+    # Polling por updated_at
+
+    async def _start_polling(self):
+        self.mode = 'polling'
+        await self._load_initial()
+        self._task = asyncio.create_task(self._poll())
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self._poll_once()
+                await self._save_snapshot(force=False)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro ao atualizar o índice em memória: {str(e)}")
+
+    async def _poll_once(self) -> int:
+        """Aplica as revendas com updated_at desde a marca d'água (e as remoções); retorna quantas alterações"""
+        since = self.watermark - self.poll_overlap
+        projection = {**SNAPSHOT_PROJECTION, "active": 1, "updated_at": 1}
+
+        newest = self.watermark
+        seen: Dict[str, datetime] = {}
+        async for doc in self.collection.find({"updated_at": {"$gte": since}}, projection):
+            key = str(doc['_id'])
+            seen[key] = doc['updated_at']
+            # A janela se sobrepõe à da consulta anterior: ignora versões já aplicadas
+            if self._polled_versions.get(key) != doc['updated_at']:
+                self._pending[key] = entry_from_document(doc)
+            if doc['updated_at'] > newest:
+                newest = doc['updated_at']
+
+        # Remoções não aparecem no updated_at: confere a contagem e, se divergir, os _ids
+        await self._collect_deletions()
+
+        applied = self._flush()
+        self.watermark = newest
+        self._polled_versions = seen
+        return applied
+
+    async def _collect_deletions(self):
+        snapshot = self.reseller_service.spatial_index.snapshot
+        pending_inserts = sum(1 for key, entry in self._pending.items() if entry is not None)
+        expected = await self.collection.count_documents(self.reseller_service.searchable_filter())
+        if expected == len(snapshot) and not pending_inserts:
+            return
+
+        live_keys = set()
+        async for doc in self.collection.find(self.reseller_service.searchable_filter(), {"_id": 1}):
+            live_keys.add(str(doc['_id']))
+
+        for key in snapshot.keys.tolist():
+            if key not in live_keys and key not in self._pending:
+                self._pending[key] = None
+
+    def stats(self) -> Dict:
+        return {
+            'mode': self.mode,
+            'applied_changes': self.applied_changes,
+            'full_reloads': self.full_reloads,
+            'loaded_from_disk': self.loaded_from_disk,
+            'pending_changes': len(self._pending),
+            'watermark': self.watermark.isoformat() if self.watermark else None,
+            'last_refresh_at': self.last_refresh_at.isoformat() if self.last_refresh_at else None
+        }
@@ -0,0 +1,188 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ('queued', 'running', 'completed', 'failed', 'cancelled')
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+
+# Motivo do cancelamento: pedido pelo usuário ou shutdown da aplicação (a tarefa pode ser retomada)
+CANCEL_REQUESTED = 'requested'
+CANCEL_SHUTDOWN = 'shutdown'
+
+
+class Job:
+    """
+    Tarefa em segundo plano (importação, enriquecimento, ...)
+
+    A função da tarefa recebe o próprio Job e atualiza `progress` à medida que avança:
+    'total' (quando conhecido), 'processed', 'enriched', 'failed' etc.
+    """
+
+    def __init__(self, kind: str):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.status = 'queued'
+        self.progress: Dict[str, int] = {'total': 0, 'processed': 0, 'enriched': 0, 'failed': 0}
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.task: Optional[asyncio.Task] = None
+        self.cancel_reason: Optional[str] = None
+        self._started_monotonic: Optional[float] = None
+        self._finished_monotonic: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def elapsed_seconds(self) -> float:
+        if self._started_monotonic is None:
+            return 0.0
+        end = self._finished_monotonic or time.monotonic()
+        return end - self._started_monotonic
+
+    def to_dict(self) -> Dict:
+        """Estado da tarefa com taxa (itens/s) e ETA calculados a partir do progresso"""
+        elapsed = self.elapsed_seconds()
+        processed = self.progress.get('processed', 0)
+        total = self.progress.get('total', 0)
+
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.status == 'running' and total and rate > 0:
+            eta = round(max(total - processed, 0) / rate, 1)
+
+        return {
+            'id': self.id,
+            'type': self.kind,
+            'status': self.status,
+            'progress': dict(self.progress),
+            'rate_per_sec': round(rate, 2),
+            'eta_seconds': eta,
+            'elapsed_seconds': round(elapsed, 1),
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'result': self.result,
+            'error': self.error
+        }
+
+
+class JobManager:
+    """
+    Executa tarefas longas fora da requisição HTTP, no próprio processo
+
+    No máximo `max_concurrent` tarefas rodam ao mesmo tempo; as demais ficam na fila ('queued').
+    As últimas `max_history` tarefas concluídas continuam consultáveis.
+    """
+
+    def __init__(self, max_concurrent: int = None, max_history: int = None):
+        self.max_concurrent = max_concurrent or int(os.environ.get('JOBS_MAX_CONCURRENT', 2))
+        self.max_history = max_history or int(os.environ.get('JOBS_MAX_HISTORY', 100))
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def submit(self, kind: str, func: Callable[[Job], Awaitable[Dict]], exclusive: bool = True) -> Job:
+        """
+        Agenda uma tarefa e retorna imediatamente
+
+        Args:
+            kind: Tipo da tarefa ('import', 'smart_enrich', ...)
+            func: Corrotina que recebe o Job e retorna o resultado final
+            exclusive: Se já houver uma tarefa ativa do mesmo tipo, retorna ela em vez de criar outra
+        """
+        if exclusive:
+            active = self.active_job(kind)
+            if active:
+                logger.info(f"Tarefa {kind} já em andamento: {active.id}")
+                return active
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        job = Job(kind)
+        self._jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, func))
+        self._prune_history()
+
+        logger.info(f"📋 Tarefa {kind} agendada: {job.id}")
+        return job
+
+    async def _run(self, job: Job, func: Callable[[Job], Awaitable[Dict]]):
+        try:
+            async with self._semaphore:
+                job.status = 'running'
+                job.started_at = datetime.utcnow()
+                job._started_monotonic = time.monotonic()
+                logger.info(f"▶️ Tarefa {job.kind} iniciada: {job.id}")
+
+                job.result = await func(job)
+                job.status = 'completed'
+        except asyncio.CancelledError:
+            job.status = 'cancelled'
+            if job.cancel_reason == CANCEL_SHUTDOWN:
+                job.error = 'interrompida pelo shutdown da aplicação'
+            logger.warning(f"⏹️ Tarefa {job.kind} cancelada ({job.cancel_reason}): {job.id}")
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            logger.error(f"❌ Tarefa {job.kind} falhou ({job.id}): {str(e)}")
+        finally:
+            job.finished_at = datetime.utcnow()
+            job._finished_monotonic = time.monotonic()
+            if job.status == 'completed':
+                logger.info(f"✅ Tarefa {job.kind} concluída em {job.elapsed_seconds():.1f}s: {job.id}")
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        """Tarefas da mais recente para a mais antiga"""
+        return list(reversed(self._jobs.values()))
+
+    def active_job(self, kind: str) -> Optional[Job]:
+        for job in self._jobs.values():
+            if job.kind == kind and not job.finished:
+                return job
+        return None
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Solicita o cancelamento; a tarefa passa a 'cancelled' quando o cancelamento chega nela"""
+        job = self._jobs.get(job_id)
+        if job and not job.finished and job.task:
+            job.cancel_reason = CANCEL_REQUESTED
+            job.task.cancel()
+        return job
+
+    def _prune_history(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(len(finished) - self.max_history, 0)]:
+            del self._jobs[job_id]
+
+    async def shutdown(self):
+        """
+        Interrompe as tarefas em andamento (chamado no shutdown da aplicação)
+
+        O cancel_reason CANCEL_SHUTDOWN permite que a tarefa guarde um checkpoint em vez de se
+        dar por cancelada, para ser retomada no próximo start.
+        """
+        tasks = []
+        for job in self._jobs.values():
+            if job.task and not job.task.done():
+                job.cancel_reason = CANCEL_SHUTDOWN
+                job.task.cancel()
+                tasks.append(job.task)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+# Instância global usada pelos endpoints de processamento de dados
+job_manager = JobManager()
@@ -1,146 +1,124 @@
+import os
 import csv
 import asyncio
 import logging
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Tuple
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from models.reseller import Reseller, ResellerCreate, CNPJData, Coordinates
 from services.cnpj_service import CNPJService
-from services.enhanced_geocoding_service import enhanced_geocoding_service
+from services.reseller_service import ResellerService
+from services.enrichment_pipeline import EnrichmentPipeline
+from services.bulk_writer import BulkUpdateBuffer
+from services.enrichment_state import EnrichmentRunStore, RUN_COUNTERS, eligible_filter
+from services.job_manager import CANCEL_REQUESTED
+from services.reseller_upsert import compute_source_hash, build_upsert_operation
 from pathlib import Path
 import pandas as pd
 
 logger = logging.getLogger(__name__)
 
+# Colunas textuais do CSV normalizado (lidas como string para preservar zeros à esquerda de CNPJ/CEP)
+CSV_DTYPES = {
+    column: 'string' for column in (
+        'cnpj', 'razao_social', 'cep', 'endereco', 'bairro', 'cidade', 'uf', 'telefone', 'whatsapp',
+        'canal_preferencial', 'ativo', 'atende_empresarial', 'atende_residencial'
+    )
+}
+CSV_NUMERIC_COLUMNS = ('latitude', 'longitude', 'service_radius_km', 'prioridade')
+
+BOOLEAN_VALUES = {
+    'true': True, 'false': False, '1': True, '0': False, '1.0': True, '0.0': False,
+    'sim': True, 'não': False, 'nao': False, 's': True, 'n': False,
+}
+
+
 class OptimizedDataService:
     """Optimized service for processing normalized reseller data efficiently"""
     
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
         self.collection = db.resellers
+        self.run_store = EnrichmentRunStore(db)
     
-    async def import_normalized_csv(self, file_path: str = "/app/backend/data/revendas_normalizado.csv") -> Dict:
+    async def import_normalized_csv(self, file_path: str = "/app/backend/data/revendas_normalizado.csv", incremental: bool = False, chunk_size: int = None, progress: Dict = None) -> Dict:
         """
         Importa arquivo CSV normalizado com estrutura otimizada
+        
+        O arquivo é lido em blocos de `chunk_size` linhas: cada bloco é gravado enquanto o
+        próximo é processado em uma thread, então a memória não cresce com o tamanho do arquivo.
+        
+        Args:
+            file_path: Caminho do CSV normalizado
+            incremental: Aplica só as linhas alteradas (upsert por CNPJ), preservando
+                         coordenadas e dados de enriquecimento já gravados
+            chunk_size: Linhas por bloco (padrão: IMPORT_CHUNK_SIZE)
+            progress: Dict atualizado a cada bloco (total, processed, imported, unchanged, failed)
         """
         try:
             if not Path(file_path).exists():
                 raise FileNotFoundError(f"Arquivo não encontrado: {file_path}")
             
-            logger.info(f"🚀 Iniciando importação otimizada do CSV normalizado: {file_path}")
-            
-            # Lê CSV com pandas para melhor performance
-            df = pd.read_csv(file_path)
-            
-            # Remove registros duplicados por CNPJ
-            df = df.drop_duplicates(subset=['cnpj'], keep='first')
+            chunk_size = chunk_size or int(os.environ.get('IMPORT_CHUNK_SIZE', 5000))
+            logger.info(f"🚀 Iniciando importação otimizada do CSV normalizado: {file_path} (blocos de {chunk_size})")
             
-            # Converte para lista de dicts
-            records = df.to_dict('records')
+            if incremental:
+                await self.collection.create_index("cnpj")
             
-            logger.info(f"📊 Processando {len(records)} revendas normalizadas")
+            loop = asyncio.get_running_loop()
+            if progress is not None:
+                # Total de linhas para a taxa/ETA da tarefa (contadas sem fazer o parse do CSV)
+                progress['total'] = await loop.run_in_executor(None, self._count_csv_rows, file_path)
             
-            # Remove duplicatas existentes por CNPJ
-            cnpjs_to_remove = [str(record['cnpj']) for record in records if record['cnpj']]
-            if cnpjs_to_remove:
-                result = await self.collection.delete_many({
-                    "cnpj": {"$in": cnpjs_to_remove}
-                })
-                logger.info(f"🗑️ Removidas {result.deleted_count} revendas duplicadas")
+            # Lê CSV com pandas já com os tipos de cada coluna, em blocos
+            reader = pd.read_csv(file_path, dtype=CSV_DTYPES, chunksize=chunk_size)
+            seen_cnpjs = set()
+            totals = {'imported': 0, 'unchanged': 0, 'errors': []}
             
-            # Prepara documentos otimizados
-            optimized_resellers = []
+            next_chunk = loop.run_in_executor(None, self._prepare_next_chunk, reader, seen_cnpjs)
+            chunk_number = 0
             
-            for record in records:
-                try:
-                    # Função auxiliar para limpar dados
-                    def clean_value(value):
-                        if pd.isna(value) or str(value).lower() in ['nan', 'null', 'none', '']:
-                            return ''
-                        return str(value).strip()
-                    
-                    def clean_float(value, default=None):
-                        try:
-                            if pd.isna(value) or str(value).lower() in ['nan', 'null', 'none', '']:
-                                return default
-                            return float(value)
-                        except (ValueError, TypeError):
-                            return default
-                    
-                    def clean_bool(value, default=True):
-                        if pd.isna(value):
-                            return default
-                        return bool(value)
-                    
-                    # Normaliza CNPJ
-                    cnpj = CNPJService.normalize_cnpj(str(record.get('cnpj', '')))
-                    if not cnpj or len(cnpj) != 14:
-                        continue
-                    
-                    # Limpa todos os dados
-                    address = clean_value(record.get('endereco'))
-                    city = clean_value(record.get('cidade'))
-                    state = clean_value(record.get('uf'))
-                    
-                    # Cria revenda otimizada
-                    reseller_data = {
-                        'name': clean_value(record.get('razao_social')),
-                        'cnpj': cnpj,
-                        'address': address,
-                        'neighborhood': clean_value(record.get('bairro')),
-                        'city': city,
-                        'state': state,
-                        'cep': clean_value(record.get('cep')),
-                        'phone': clean_value(record.get('telefone')),
-                        'whatsapp': clean_value(record.get('whatsapp')),
-                        'hours': 'Segunda a Sábado: 8h às 18h',  # Default
-                        'active': clean_bool(record.get('ativo'), True),
-                        'data_enriched': False,  # Inicialmente não enriquecido
-                        'service_radius_km': clean_float(record.get('service_radius_km'), 10.0),
-                        'priority': int(clean_float(record.get('prioridade'), 0)),
-                        'serves_business': clean_bool(record.get('atende_empresarial'), True),
-                        'serves_residential': clean_bool(record.get('atende_residencial'), True),
-                        'preferred_channel': clean_value(record.get('canal_preferencial')) or 'phone'
-                    }
+            try:
+                while True:
+                    chunk = await next_chunk
+                    if chunk is None:
+                        break
+                    optimized_resellers, rows_read = chunk
                     
-                    # Adiciona coordenadas se existirem e forem válidas
-                    lat = clean_float(record.get('latitude'))
-                    lng = clean_float(record.get('longitude'))
+                    # Processa o próximo bloco enquanto este é gravado
+                    next_chunk = loop.run_in_executor(None, self._prepare_next_chunk, reader, seen_cnpjs)
+                    chunk_number += 1
                     
-                    if lat is not None and lng is not None and not (pd.isna(lat) or pd.isna(lng)):
-                        reseller_data['coordinates'] = {'lat': lat, 'lng': lng}
-                        reseller_data['geocoding_source'] = 'normalized_data'
-                        reseller_data['data_enriched'] = True
+                    if incremental:
+                        await self._apply_incremental_import(optimized_resellers, totals)
                     else:
-                        reseller_data['coordinates'] = None
-                    
-                    # Se tem endereço válido mas não tem coordenadas, marca para geocoding
-                    if address and city and not reseller_data['coordinates']:
-                        reseller_data['needs_geocoding'] = True
+                        await self._replace_resellers(optimized_resellers, totals)
                     
-                    reseller = Reseller(**reseller_data)
-                    optimized_resellers.append(reseller.dict())
+                    if progress is not None:
+                        progress['processed'] = progress.get('processed', 0) + rows_read
+                        progress['imported'] = totals['imported']
+                        progress['unchanged'] = totals['unchanged']
+                        progress['failed'] = len(totals['errors'])
                     
-                except Exception as e:
-                    logger.error(f"Erro ao processar registro CNPJ {record.get('cnpj', 'unknown')}: {str(e)}")
-                    continue
+                    logger.info(f"📥 Bloco {chunk_number}: {len(optimized_resellers)} revendas processadas ({totals['imported']} gravadas até agora)")
+            finally:
+                # Em caso de erro, espera o bloco em andamento antes de fechar o arquivo
+                if not next_chunk.done():
+                    await asyncio.wait([next_chunk])
+                reader.close()
             
-            # Inserção em lote para melhor performance
-            if optimized_resellers:
-                batch_size = 1000
-                total_inserted = 0
-                
-                for i in range(0, len(optimized_resellers), batch_size):
-                    batch = optimized_resellers[i:i + batch_size]
-                    result = await self.collection.insert_many(batch)
-                    total_inserted += len(result.inserted_ids)
-                    logger.info(f"📥 Lote {i//batch_size + 1}: {len(result.inserted_ids)} revendas inseridas")
-                
-                logger.info(f"✅ {total_inserted} revendas importadas com sucesso!")
+            logger.info(f"✅ {totals['imported']} revendas importadas com sucesso!")
+            
+            if incremental:
+                message = f"{totals['imported']} revendas atualizadas, {totals['unchanged']} sem alteração"
+            else:
+                message = f"{totals['imported']} revendas otimizadas importadas com sucesso"
             
             return {
                 'success': True,
-                'total_imported': len(optimized_resellers),
-                'message': f'{len(optimized_resellers)} revendas otimizadas importadas com sucesso'
+                'total_imported': totals['imported'],
+                'total_unchanged': totals['unchanged'],
+                'errors': totals['errors'],
+                'message': message
             }
             
         except Exception as e:
@@ -151,73 +129,246 @@ class OptimizedDataService:
                 'message': f'Erro na importação: {str(e)}'
             }
     
-    async def smart_enrich_all_data(self, batch_size: int = 20) -> Dict:
+    @staticmethod
+    def _count_csv_rows(file_path: str) -> int:
+        """Conta as linhas de dados do CSV (sem o cabeçalho) lendo o arquivo em blocos binários"""
+        lines = 0
+        last_byte = b'\n'
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                lines += block.count(b'\n')
+                last_byte = block[-1:]
+        # Última linha sem quebra de linha no fim do arquivo
+        if last_byte != b'\n':
+            lines += 1
+        return max(lines - 1, 0)
+    
+    def _prepare_next_chunk(self, reader, seen_cnpjs: set) -> Optional[Tuple[List[Dict], int]]:
+        """
+        Lê, limpa e monta os documentos do próximo bloco do CSV (executado em thread)
+        
+        Returns:
+            (documentos do bloco, linhas lidas do CSV), ou None ao fim do arquivo
+        """
+        try:
+            df = next(reader)
+        except StopIteration:
+            return None
+        
+        frame = self._clean_frame(df)
+        
+        # Remove registros duplicados por CNPJ (já normalizado), inclusive entre blocos
+        frame = frame.drop_duplicates(subset=['cnpj'], keep='first')
+        frame = frame[~frame['cnpj'].isin(seen_cnpjs)]
+        seen_cnpjs.update(frame['cnpj'].tolist())
+        
+        return self._build_documents(frame), len(df)
+    
+    async def _replace_resellers(self, documents: List[Dict], totals: Dict):
+        """Substitui as revendas do bloco: remove as existentes com o mesmo CNPJ e insere as novas"""
+        if not documents:
+            return
+        
+        # Remove duplicatas existentes por CNPJ (normalizado, como está gravado)
+        result = await self.collection.delete_many({
+            "cnpj": {"$in": [document['cnpj'] for document in documents]}
+        })
+        if result.deleted_count:
+            logger.info(f"🗑️ Removidas {result.deleted_count} revendas duplicadas")
+        
+        result = await self.collection.insert_many(documents)
+        totals['imported'] += len(result.inserted_ids)
+    
+    @staticmethod
+    def _clean_frame(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Limpa o CSV normalizado coluna a coluna (sem laços por linha)
+        
+        Returns:
+            DataFrame com as colunas já no formato do documento da revenda, apenas com CNPJs válidos
+        """
+        df = df.reindex(columns=list(CSV_DTYPES.keys()) + list(CSV_NUMERIC_COLUMNS))
+        
+        def text(column: str) -> pd.Series:
+            values = df[column].astype('string').str.strip().fillna('')
+            return values.mask(values.str.lower().isin(['nan', 'null', 'none']), '')
+        
+        def number(column: str) -> pd.Series:
+            return pd.to_numeric(df[column], errors='coerce')
+        
+        def flag(column: str, default: bool = True) -> pd.Series:
+            values = df[column].astype('string').str.strip().str.lower()
+            return values.map(BOOLEAN_VALUES).fillna(default).astype(bool)
+        
+        frame = pd.DataFrame({
+            'name': text('razao_social'),
+            'cnpj': CNPJService.normalize_cnpj_series(df['cnpj']),
+            'address': text('endereco'),
+            'neighborhood': text('bairro'),
+            'city': text('cidade'),
+            'state': text('uf'),
+            'cep': text('cep'),
+            'phone': text('telefone'),
+            'whatsapp': text('whatsapp'),
+            'active': flag('ativo'),
+            'service_radius_km': number('service_radius_km').fillna(10.0),
+            'priority': number('prioridade').fillna(0).astype(int),
+            'serves_business': flag('atende_empresarial'),
+            'serves_residential': flag('atende_residencial'),
+            'preferred_channel': text('canal_preferencial').replace('', 'phone'),
+            'lat': number('latitude'),
+            'lng': number('longitude'),
+        })
+        
+        frame['has_coordinates'] = frame['lat'].notna() & frame['lng'].notna()
+        # Se tem endereço válido mas não tem coordenadas, marca para geocoding
+        frame['needs_geocoding'] = (frame['address'] != '') & (frame['city'] != '') & ~frame['has_coordinates']
+        
+        return frame[frame['cnpj'].str.len() == 14]
+    
+    @staticmethod
+    def _build_documents(frame: pd.DataFrame) -> List[Dict]:
+        """Monta os documentos das revendas em uma única passada sobre o DataFrame limpo"""
+        documents = []
+        columns = [column for column in frame.columns if column not in ('lat', 'lng', 'has_coordinates')]
+        
+        rows = zip(*(frame[column].tolist() for column in columns))
+        
+        for values, lat, lng, has_coordinates in zip(
+            rows,
+            frame['lat'].tolist(),
+            frame['lng'].tolist(),
+            frame['has_coordinates'].tolist()
+        ):
+            row = dict(zip(columns, values))
+            try:
+                reseller_data = {
+                    **row,
+                    'hours': 'Segunda a Sábado: 8h às 18h',  # Default
+                    'data_enriched': has_coordinates,
+                    'coordinates': {'lat': lat, 'lng': lng} if has_coordinates else None,
+                }
+                if has_coordinates:
+                    reseller_data['geocoding_source'] = 'normalized_data'
+                
+                # Dados já limpos e tipados por _clean_frame: monta o documento sem revalidar
+                document = Reseller.new_document(**reseller_data)
+                document['location'] = ResellerService.build_location(document.get('coordinates'))
+                document['source_hash'] = compute_source_hash(reseller_data)
+                documents.append(document)
+                
+            except Exception as e:
+                logger.error(f"Erro ao processar registro CNPJ {row.get('cnpj', 'unknown')}: {str(e)}")
+                continue
+        
+        return documents
+    
+    async def _apply_incremental_import(self, documents: List[Dict], totals: Dict):
+        """
+        Grava só as revendas do bloco cuja linha no CSV mudou desde a última importação
+        
+        A comparação usa o hash do conteúdo da linha (source_hash). Campos vazios na origem não
+        sobrescrevem o que já está no banco, e coordenadas/cnpj_data só mudam quando a linha traz valores.
+        """
+        if not documents:
+            return
+        
+        stored_hashes = {}
+        cursor = self.collection.find(
+            {"cnpj": {"$in": [document['cnpj'] for document in documents]}},
+            {"_id": 0, "cnpj": 1, "source_hash": 1}
+        )
+        async for doc in cursor:
+            stored_hashes[doc['cnpj']] = doc.get('source_hash')
+        
+        changed = [document for document in documents if stored_hashes.get(document['cnpj']) != document['source_hash']]
+        unchanged = len(documents) - len(changed)
+        
+        logger.info(f"🔁 Importação incremental: {len(changed)} revendas alteradas, {unchanged} sem mudança")
+        
+        buffer = BulkUpdateBuffer(self.collection, max_operations=1000)
+        for document in changed:
+            await buffer.add(build_upsert_operation(document), key=document['cnpj'])
+        errors = await buffer.close()
+        
+        totals['imported'] += len(changed) - len(errors)
+        totals['unchanged'] += unchanged
+        totals['errors'].extend(f"CNPJ {error['key']}: {error['error']}" for error in errors)
+    
+    async def smart_enrich_all_data(self, concurrency: int = None, progress: Dict = None,
+                                    cancel_reason: Callable[[], Optional[str]] = None) -> Dict:
         """
         Enriquecimento inteligente - prioriza revendas que já têm dados parciais
+        
+        Se a execução anterior foi interrompida (ex.: restart), ela é retomada a partir do último
+        checkpoint. Revendas que falharam recentemente ficam de fora até o backoff expirar.
+        
+        Args:
+            concurrency: Consultas de CNPJ simultâneas (padrão: ENRICH_CNPJ_CONCURRENCY)
+            progress: Dict atualizado durante a execução (total, processed, enriched, not_found, throttled, failed)
+            cancel_reason: Motivo de um cancelamento (CANCEL_REQUESTED encerra a execução como
+                'cancelled'; qualquer outro, ex. shutdown, guarda o checkpoint para retomada)
         """
         try:
             logger.info("🧠 Iniciando enriquecimento inteligente de dados")
             
-            # Busca revendas que precisam de enriquecimento, priorizando as que já têm dados
-            pipeline = [
-                {
-                    "$match": {
-                        "$and": [
-                            {"data_enriched": {"$ne": True}},
-                            {"cnpj": {"$exists": True, "$ne": None, "$ne": ""}},
-                            {"active": {"$ne": False}}
-                        ]
-                    }
-                },
-                {
-                    "$addFields": {
-                        "priority_score": {
-                            "$add": [
-                                {"$cond": [{"$ne": ["$address", ""]}, 10, 0]},
-                                {"$cond": [{"$ne": ["$city", ""]}, 5, 0]},
-                                {"$cond": [{"$ne": ["$phone", ""]}, 3, 0]},
-                                {"$cond": [{"$ne": ["$coordinates", None]}, -20, 0]},  # Menos prioridade se já tem coords
-                                {"$multiply": ["$priority", 2]}  # Duplica prioridade do negócio
-                            ]
-                        }
+            run, resellers = await self._resume_interrupted_run()
+            
+            if run is None:
+                resellers = await self._select_resellers_to_enrich()
+                
+                if not resellers:
+                    return {
+                        'success': True,
+                        'total_processed': 0,
+                        'total_enriched': 0,
+                        'message': 'Nenhuma revenda para enriquecer'
                     }
-                },
-                {"$sort": {"priority_score": -1}},
-                {"$limit": 1000}  # Processa até 1000 por vez
-            ]
+                
+                run = await self.run_store.create([reseller['_id'] for reseller in resellers])
             
-            cursor = self.collection.aggregate(pipeline)
-            resellers = await cursor.to_list(None)
+            logger.info(f"🎯 Execução {run['_id']}: {len(resellers)} revendas priorizadas para enriquecimento")
             
-            if not resellers:
-                return {
-                    'success': True,
-                    'total_processed': 0,
-                    'total_enriched': 0,
-                    'message': 'Nenhuma revenda para enriquecer'
-                }
+            # Contadores continuam de onde o checkpoint parou
+            stats = progress if progress is not None else {}
+            stats.update({counter: run.get(counter, 0) for counter in RUN_COUNTERS})
+            stats['total'] = run['total']
             
-            logger.info(f"🎯 Encontradas {len(resellers)} revendas priorizadas para enriquecimento")
+            checkpointer = asyncio.create_task(self._checkpoint_periodically(run['_id'], stats))
+            try:
+                # CNPJ, geocoding e gravação rodam em paralelo, limitados só pelo ritmo dos provedores
+                await EnrichmentPipeline(
+                    self.collection, cnpj_concurrency=concurrency, stats=stats, run_id=run['_id']
+                ).run(resellers)
+            except asyncio.CancelledError:
+                # O pipeline só repassa o cancelamento depois de gravar os buffers pendentes,
+                # então o estado abaixo já inclui tudo que foi gravado. O checkpoint periódico
+                # para antes: ele não pode sobrescrever o estado final
+                checkpointer.cancel()
+                await asyncio.gather(checkpointer, return_exceptions=True)
+                if cancel_reason and cancel_reason() == CANCEL_REQUESTED:
+                    await self.run_store.finish(run['_id'], 'cancelled', stats)
+                else:
+                    # Shutdown/restart: continua 'running' e é retomada no próximo start
+                    await self.run_store.checkpoint(run['_id'], stats, interrupted=True)
+                raise
+            except Exception:
+                # Mantém como 'running': a próxima execução retoma a partir do checkpoint
+                await self.run_store.checkpoint(run['_id'], stats)
+                raise
+            finally:
+                checkpointer.cancel()
             
-            total_enriched = 0
-            
-            # Processa em lotes menores para melhor controle
-            for i in range(0, len(resellers), batch_size):
-                batch = resellers[i:i + batch_size]
-                
-                logger.info(f"⚡ Processando lote {i//batch_size + 1}/{(len(resellers) + batch_size - 1)//batch_size}")
-                
-                # Enriquece lote atual
-                enriched_count = await self._smart_enrich_batch(batch)
-                total_enriched += enriched_count
-                
-                # Aguarda menos tempo entre lotes para maior eficiência
-                await asyncio.sleep(0.5)
+            await self.run_store.finish(run['_id'], 'completed', stats)
+            total_enriched = stats['enriched']
             
             return {
                 'success': True,
-                'total_processed': len(resellers),
+                'run_id': run['_id'],
+                'total_processed': stats['processed'],
                 'total_enriched': total_enriched,
+                'total_not_found': stats['not_found'],
+                'total_throttled': stats['throttled'],
                 'message': f'{total_enriched} revendas enriquecidas com dados otimizados'
             }
             
@@ -230,101 +381,68 @@ class OptimizedDataService:
                 'message': f'Erro no enriquecimento: {str(e)}'
             }
     
-    async def _smart_enrich_batch(self, batch: List[Dict]) -> int:
-        """Enriquece um lote de revendas de forma inteligente"""
-        enriched_count = 0
-        
-        # Agrupa CNPJs para requisições em lote
-        cnpjs_to_process = []
-        resellers_by_cnpj = {}
-        
-        for reseller_doc in batch:
-            cnpj = reseller_doc.get('cnpj')
-            if cnpj:
-                cnpjs_to_process.append(cnpj)
-                resellers_by_cnpj[cnpj] = reseller_doc
-        
-        if not cnpjs_to_process:
-            return 0
-        
-        # Processa CNPJs em lote (mais eficiente)
-        logger.info(f"📞 Buscando dados de {len(cnpjs_to_process)} CNPJs em lote")
-        cnpj_results = await CNPJService.batch_get_companies_data(cnpjs_to_process, batch_size=3, delay=0.3)
+    async def _select_resellers_to_enrich(self) -> List[Dict]:
+        """Revendas que precisam de enriquecimento e não estão em backoff, priorizando as que já têm dados"""
+        pipeline = [
+            {
+                "$match": {
+                    "$and": [
+                        {"data_enriched": {"$ne": True}},
+                        {"cnpj": {"$exists": True, "$ne": None, "$ne": ""}},
+                        {"active": {"$ne": False}},
+                        eligible_filter()
+                    ]
+                }
+            },
+            {
+                "$addFields": {
+                    "priority_score": {
+                        "$add": [
+                            {"$cond": [{"$ne": ["$address", ""]}, 10, 0]},
+                            {"$cond": [{"$ne": ["$city", ""]}, 5, 0]},
+                            {"$cond": [{"$ne": ["$phone", ""]}, 3, 0]},
+                            {"$cond": [{"$ne": ["$coordinates", None]}, -20, 0]},  # Menos prioridade se já tem coords
+                            {"$multiply": ["$priority", 2]}  # Duplica prioridade do negócio
+                        ]
+                    }
+                }
+            },
+            {"$sort": {"priority_score": -1}},
+            {"$limit": 1000}  # Processa até 1000 por vez
+        ]
         
-        # Processa geocoding para endereços válidos
-        addresses_to_geocode = []
-        geocode_mapping = {}
+        cursor = self.collection.aggregate(pipeline)
+        return await cursor.to_list(None)
+    
+    async def _resume_interrupted_run(self) -> Tuple[Optional[Dict], List[Dict]]:
+        """
+        Retoma a última execução interrompida
         
-        for cnpj, cnpj_data in cnpj_results.items():
-            if cnpj_data and cnpj_data.get('endereco_completo'):
-                addresses_to_geocode.append({
-                    'endereco_completo': cnpj_data['endereco_completo'],
-                    'cidade': cnpj_data.get('cidade', ''),
-                    'estado': cnpj_data.get('estado', '')
-                })
-                geocode_mapping[cnpj_data['endereco_completo']] = cnpj
+        Returns:
+            (execução, revendas ainda não tentadas nela) ou (None, []) se não houver o que retomar
+        """
+        run = await self.run_store.find_interrupted()
+        if not run or not await self.run_store.claim(run):
+            return None, []
         
-        # Geocoding em lote (mais eficiente)
-        geocode_results = {}
-        if addresses_to_geocode:
-            logger.info(f"🗺️ Buscando coordenadas de {len(addresses_to_geocode)} endereços")
-            geocode_results = await enhanced_geocoding_service.batch_geocode_addresses(addresses_to_geocode, batch_size=5, delay=0.2)
+        cursor = self.collection.find({
+            "_id": {"$in": run['reseller_ids']},
+            "data_enriched": {"$ne": True},
+            "enrichment_state.last_run_id": {"$ne": run['_id']}
+        })
+        resellers = await cursor.to_list(None)
         
-        # Atualiza documentos no banco
-        for cnpj, cnpj_data in cnpj_results.items():
-            if not cnpj_data:
-                continue
-                
+        logger.info(f"♻️ Retomando execução {run['_id']}: {len(resellers)} de {run['total']} revendas pendentes")
+        return run, resellers
+    
+    async def _checkpoint_periodically(self, run_id: str, stats: Dict):
+        interval = float(os.environ.get('ENRICH_CHECKPOINT_INTERVAL', 5.0))
+        while True:
+            await asyncio.sleep(interval)
             try:
-                reseller_doc = resellers_by_cnpj.get(cnpj)
-                if not reseller_doc:
-                    continue
-                
-                # Monta dados de atualização
-                update_data = {
-                    'name': cnpj_data.get('razao_social', reseller_doc.get('name', '')),
-                    'address': cnpj_data.get('logradouro', '') + (f", {cnpj_data.get('numero', '')}" if cnpj_data.get('numero') else ''),
-                    'neighborhood': cnpj_data.get('bairro', ''),
-                    'city': cnpj_data.get('cidade', ''),
-                    'state': cnpj_data.get('estado', ''),
-                    'cep': cnpj_data.get('cep', ''),
-                    'phone': cnpj_data.get('telefone', ''),
-                    'cnpj_data': {
-                        'cnpj': cnpj_data['cnpj'],
-                        'razao_social': cnpj_data.get('razao_social'),
-                        'nome_fantasia': cnpj_data.get('nome_fantasia'),
-                        'atividade_principal': cnpj_data.get('atividade_principal'),
-                        'situacao': cnpj_data.get('situacao'),
-                        'telefone': cnpj_data.get('telefone'),
-                        'email': cnpj_data.get('email')
-                    },
-                    'data_enriched': True
-                }
-                
-                # Adiciona coordenadas se encontradas
-                endereco_completo = cnpj_data.get('endereco_completo', '')
-                if endereco_completo in geocode_results and geocode_results[endereco_completo]:
-                    coord_data = geocode_results[endereco_completo]
-                    update_data['coordinates'] = {
-                        'lat': coord_data['lat'],
-                        'lng': coord_data['lng']
-                    }
-                    update_data['geocoding_source'] = coord_data['api_source']
-                
-                # Atualiza documento
-                await self.collection.update_one(
-                    {"_id": reseller_doc["_id"]},
-                    {"$set": update_data}
-                )
-                
-                enriched_count += 1
-                
+                await self.run_store.checkpoint(run_id, stats)
             except Exception as e:
-                logger.error(f"Erro ao enriquecer revenda {cnpj}: {str(e)}")
-                continue
-        
-        logger.info(f"✅ Lote processado: {enriched_count} revendas enriquecidas")
-        return enriched_count
+                logger.error(f"Erro ao gravar checkpoint da execução {run_id}: {str(e)}")
     
     async def get_optimization_stats(self) -> Dict:
         """Retorna estatísticas otimizadas do sistema"""
@@ -0,0 +1,80 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Limitador assíncrono token bucket: até `burst` requisições imediatas, reabastecido a `rate` por segundo"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self):
+        """Aguarda até haver um token disponível (chamadores são atendidos em ordem de chegada)"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+
+                await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Suspende o provedor (ex.: após HTTP 429) e descarta os tokens acumulados"""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+
+class RateLimiterRegistry:
+    """Um token bucket por provedor externo, compartilhado por todos os chamadores"""
+
+    # provedor -> (variável de taxa, taxa padrão, variável de burst, burst padrão)
+    PROVIDER_SETTINGS = {
+        'brasilapi': ('BRASILAPI_RATE_PER_SEC', 3.0, 'BRASILAPI_BURST', 3),
+        # Política de uso do Nominatim: no máximo 1 requisição por segundo
+        'nominatim': ('NOMINATIM_RATE_PER_SEC', 1.0, 'NOMINATIM_BURST', 1),
+        'google_maps': ('GOOGLE_MAPS_QPS', 40.0, 'GOOGLE_MAPS_BURST', 10),
+    }
+
+    def __init__(self):
+        self._buckets: Dict[str, TokenBucket] = {}
+
+        for provider, (rate_var, default_rate, burst_var, default_burst) in self.PROVIDER_SETTINGS.items():
+            rate = float(os.environ.get(rate_var, default_rate))
+            burst = int(os.environ.get(burst_var, default_burst))
+            self._buckets[provider] = TokenBucket(rate, burst)
+
+    def get(self, provider: str) -> TokenBucket:
+        """Token bucket do provedor (provedores sem configuração usam 1 req/s)"""
+        bucket = self._buckets.get(provider)
+        if bucket is None:
+            bucket = self._buckets[provider] = TokenBucket(1.0, 1)
+        return bucket
+
+    async def acquire(self, provider: str):
+        await self.get(provider).acquire()
+
+    def pause(self, provider: str, seconds: float):
+        logger.warning(f"⏸️ Provedor {provider} pausado por {seconds:.1f}s")
+        self.get(provider).pause(seconds)
+
+# Instância global compartilhada por todos os serviços
+rate_limiters = RateLimiterRegistry()
@@ -1,22 +1,92 @@
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from models.reseller import Reseller, ResellerResponse, ResellerCreate
 from services.cep_service import CEPService
 from services.distance_service import DistanceService
+from services.spatial_index import ResellerSpatialIndex
+from services.reseller_snapshot import ResellerSnapshot, RESPONSE_FIELDS, SNAPSHOT_PROJECTION, entry_from_document
+from services.index_refresher import ResellerIndexRefresher
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+# Modos de busca: 'memory' (índice espacial no processo) ou 'geonear' ($geoNear no MongoDB)
+SEARCH_MODES = ('memory', 'geonear')
+
 class ResellerService:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
         self.collection = db.resellers
+        self.spatial_index = ResellerSpatialIndex()
+        self.index_refresher = ResellerIndexRefresher(self)
+        self.search_mode = os.environ.get('RESELLER_SEARCH_MODE', 'memory').lower()
+        
+        if self.search_mode not in SEARCH_MODES:
+            logger.warning(f"Modo de busca desconhecido '{self.search_mode}', usando 'memory'")
+            self.search_mode = 'memory'
+    
+    @staticmethod
+    def build_location(coordinates: Optional[Dict]) -> Optional[Dict]:
+        """Converte {lat, lng} em um ponto GeoJSON (campo 'location', indexado com 2dsphere)"""
+        if not coordinates or coordinates.get('lat') is None or coordinates.get('lng') is None:
+            return None
+        return {'type': 'Point', 'coordinates': [coordinates['lng'], coordinates['lat']]}
+    
+    async def initialize(self):
+        """
+        Prepara o índice espacial (modo 'memory', mantido em dia pelo ResellerIndexRefresher,
+        sem recargas completas após importações) e o índice 2dsphere do MongoDB
+
+        Só o modo 'geonear' depende do 2dsphere: no modo 'memory' uma falha ao criá-lo é
+        registrada e a busca segue pelo índice em memória.
+        """
+        if self.search_mode == 'memory':
+            await self.index_refresher.start()
+            logger.info(f"✅ Índice espacial carregado com {len(self.spatial_index)} revendas")
+            try:
+                await self.ensure_geo_index()
+            except Exception as e:
+                logger.warning(f"Índice 2dsphere não criado (busca em memória não é afetada): {str(e)}")
+        else:
+            await self.ensure_geo_index()
+            logger.info("✅ Busca de revendas usando $geoNear no MongoDB")
+    
+    async def ensure_geo_index(self):
+        """Preenche o campo GeoJSON 'location' a partir de 'coordinates' e cria o índice 2dsphere"""
+        result = await self.collection.update_many(
+            {
+                "coordinates.lat": {"$type": "number"},
+                "coordinates.lng": {"$type": "number"},
+                "location": {"$exists": False}
+            },
+            [{"$set": {"location": {"type": "Point", "coordinates": ["$coordinates.lng", "$coordinates.lat"]}}}]
+        )
+        if result.modified_count:
+            logger.info(f"📍 Campo 'location' preenchido em {result.modified_count} revendas")
+        
+        await self.collection.create_index([("location", "2dsphere")], name="location_2dsphere")
+    
+    async def close(self):
+        """Para a atualização do índice em memória (chamado no shutdown da aplicação)"""
+        await self.index_refresher.stop()
+    
+    @staticmethod
+    def searchable_filter() -> Dict:
+        """Revendas que entram na busca: ativas e com coordenadas"""
+        return {
+            "active": True,
+            "coordinates": {"$exists": True, "$ne": None}
+        }
     
     async def create_reseller(self, reseller_data: ResellerCreate) -> Reseller:
         """Cria uma nova revenda"""
         reseller = Reseller(**reseller_data.dict())
         
-        await self.collection.insert_one(reseller.dict())
+        document = reseller.dict()
+        document['location'] = self.build_location(document.get('coordinates'))
+        
+        await self.collection.insert_one(document)
         return reseller
     
     async def get_all_resellers(self) -> List[Reseller]:
@@ -32,6 +102,45 @@ class ResellerService:
         
         return resellers
     
+    async def get_searchable_entries(self) -> List[Dict]:
+        """
+        Revendas ativas com coordenadas como entradas do snapshot (campos da resposta, prioridade,
+        flag de enriquecimento e lat/lng)
+        
+        Caminho rápido da busca: evita montar e validar um Reseller completo por documento.
+        """
+        cursor = self.collection.find(self.searchable_filter(), SNAPSHOT_PROJECTION)
+        
+        entries = []
+        async for doc in cursor:
+            entry = entry_from_document(doc)
+            if entry is not None:
+                entries.append(entry)
+        
+        return entries
+    
+    async def load_spatial_index(self) -> int:
+        """
+        Carrega as revendas ativas com coordenadas no índice espacial em memória
+        
+        Returns:
+            Número de revendas indexadas
+        """
+        self.set_index_snapshot(ResellerSnapshot.build(await self.get_searchable_entries()))
+        return len(self.spatial_index)
+    
+    def set_index_snapshot(self, snapshot: ResellerSnapshot):
+        """Constrói um novo índice sobre o snapshot e só então substitui o atual"""
+        self.spatial_index = ResellerSpatialIndex(self.spatial_index.cell_size).build(snapshot)
+    
+    def apply_index_changes(self, changes: Dict[str, Optional[Dict]]):
+        """
+        Aplica alterações incrementais ({_id: entrada ou None}) ao índice em memória
+        
+        O novo índice é montado à parte e substitui o atual numa única atribuição.
+        """
+        self.set_index_snapshot(self.spatial_index.snapshot.apply(changes))
+    
     async def search_resellers_by_cep(self, cep: str, max_distance: float = 50.0, limit: int = 10) -> List[ResellerResponse]:
         """
         Busca revendas próximas a um CEP
@@ -60,50 +169,74 @@ class ResellerService:
             
             cep_coords = (cep_coordinates['lat'], cep_coordinates['lng'])
             
-            # Busca todas as revendas ativas
-            resellers = await self.get_all_resellers()
+            # O MongoDB devolve só as N mais próximas, já ordenadas
+            if self.search_mode == 'geonear':
+                return await self._search_with_geonear(cep_coords, max_distance, limit)
             
-            if not resellers:
+            # Usa o índice espacial em memória quando disponível (sem varrer o banco)
+            if self.spatial_index.loaded:
+                matches = self.spatial_index.query_nearest(cep_coords[0], cep_coords[1], k=limit, max_distance=max_distance)
+                return [ResellerResponse(**entry, distance=distance) for distance, entry in matches]
+            
+            return await self._search_by_scan(cep_coords, max_distance, limit)
+            
+        except Exception as e:
+            logger.error(f"Erro na busca por revendas: {str(e)}")
+            return []
+    
+    async def _search_with_geonear(self, cep_coords: Tuple[float, float], max_distance: float, limit: int) -> List[ResellerResponse]:
+        """Busca pelo índice 2dsphere com $geoNear (maxDistance e limit aplicados no banco)"""
+        projection = {field: 1 for field in RESPONSE_FIELDS}
+        projection.update({"_id": 0, "distance": 1, "data_enriched": 1})
+        
+        pipeline = [
+            {
+                "$geoNear": {
+                    "near": {"type": "Point", "coordinates": [cep_coords[1], cep_coords[0]]},
+                    "key": "location",
+                    "distanceField": "distance",
+                    "distanceMultiplier": 0.001,  # metros -> km
+                    "maxDistance": max_distance * 1000,
+                    "query": {"active": True},
+                    "spherical": True
+                }
+            },
+            {"$limit": limit},
+            {"$project": projection}
+        ]
+        
+        resellers = []
+        async for doc in self.collection.aggregate(pipeline):
+            doc['distance'] = round(doc['distance'], 1)
+            resellers.append(ResellerResponse(
+                **{field: doc.get(field) or '' for field in RESPONSE_FIELDS},
+                data_enriched=bool(doc.get('data_enriched')),
+                distance=doc['distance']
+            ))
+        
+        return resellers
+    
+    async def _search_by_scan(self, cep_coords: Tuple[float, float], max_distance: float, limit: int) -> List[ResellerResponse]:
+        """Busca por varredura completa do banco (usada enquanto o índice espacial não foi carregado)"""
+        try:
+            # Busca todas as revendas ativas com coordenadas (dicts projetados, sem validação por documento)
+            snapshot = ResellerSnapshot.build(await self.get_searchable_entries())
+            
+            if not len(snapshot):
                 logger.info("Nenhuma revenda encontrada no banco de dados")
                 return []
             
-            # Calcula distâncias e filtra
-            resellers_with_distance = []
-            
-            for reseller in resellers:
-                try:
-                    # Verifica se a revenda tem coordenadas
-                    if not reseller.coordinates or not hasattr(reseller.coordinates, 'lat') or not hasattr(reseller.coordinates, 'lng'):
-                        logger.warning(f"Revenda {reseller.name} não tem coordenadas válidas. Pulando...")
-                        continue
-                    
-                    reseller_coords = (reseller.coordinates.lat, reseller.coordinates.lng)
-                    distance = DistanceService.calculate_distance_from_cep(cep_coords, reseller_coords)
-                    
-                    # Filtra por distância máxima
-                    if distance <= max_distance:
-                        reseller_response = ResellerResponse(
-                            id=reseller.id,
-                            name=reseller.name,
-                            address=reseller.address,
-                            neighborhood=reseller.neighborhood,
-                            city=reseller.city,
-                            state=reseller.state,
-                            cep=reseller.cep,
-                            phone=reseller.phone,
-                            hours=reseller.hours,
-                            distance=distance
-                        )
-                        resellers_with_distance.append(reseller_response)
-                        
-                except Exception as e:
-                    logger.error(f"Erro ao calcular distância para revenda {reseller.name}: {str(e)}")
-                    continue
-            
-            # Ordena por distância (mais próximo primeiro) e limita resultados
-            resellers_with_distance.sort(key=lambda x: x.distance)
-            
-            return resellers_with_distance[:limit]
+            # Calcula todas as distâncias de uma vez e filtra pelo raio
+            positions, distances = DistanceService.distances_within(
+                cep_coords[0], cep_coords[1], snapshot.lats, snapshot.lngs, max_distance
+            )
+            
+            # Seleciona só as `limit` mais próximas e monta a resposta apenas delas
+            order = DistanceService.nearest_order(distances, limit)
+            return [
+                ResellerResponse(**snapshot.row(position), distance=round(distance, 1))
+                for position, distance in zip(positions[order].tolist(), distances[order].tolist())
+            ]
             
         except Exception as e:
             logger.error(f"Erro na busca por revendas: {str(e)}")
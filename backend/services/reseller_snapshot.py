@@ -0,0 +1,199 @@
+import logging
+import numpy as np
+from typing import Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Campos da revenda mantidos em memória para montar a resposta da busca
+RESPONSE_FIELDS = ('id', 'name', 'address', 'neighborhood', 'city', 'state', 'cep', 'phone', 'hours')
+
+# Projeção do MongoDB com tudo que entry_from_document usa (o _id vem por padrão)
+SNAPSHOT_PROJECTION = {
+    **{field: 1 for field in RESPONSE_FIELDS},
+    'coordinates': 1,
+    'priority': 1,
+    'data_enriched': 1
+}
+
+
+def entry_from_document(doc: Dict) -> Optional[Dict]:
+    """
+    Entrada do snapshot a partir de um documento de revenda (completo ou projetado)
+
+    Returns:
+        None quando a revenda não entra na busca (inativa ou sem coordenadas)
+    """
+    coordinates = doc.get('coordinates') or {}
+    if not doc.get('active', True) or coordinates.get('lat') is None or coordinates.get('lng') is None:
+        return None
+
+    entry = {field: doc.get(field) for field in RESPONSE_FIELDS}
+    entry.update({
+        'key': str(doc['_id']),
+        'lat': coordinates['lat'],
+        'lng': coordinates['lng'],
+        'priority': doc.get('priority'),
+        'data_enriched': doc.get('data_enriched')
+    })
+    return entry
+
+
+class StringTable:
+    """
+    Tabela de strings internadas: cada valor distinto aparece uma única vez num blob UTF-8
+
+    A string de código i ocupa blob[offsets[i]:offsets[i + 1]]. Cidades, estados, bairros e
+    horários se repetem muito entre as revendas e passam a custar só um código int32 por linha.
+    """
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    def concat(self, other: 'StringTable') -> 'StringTable':
+        """Nova tabela com as strings de `other` depois destas (códigos de `other` deslocados de len(self))"""
+        return StringTable(
+            np.concatenate([self.blob, other.blob]),
+            np.concatenate([self.offsets, other.offsets[1:] + self.offsets[-1]])
+        )
+
+    @classmethod
+    def from_codes(cls, codes: Dict[str, int]) -> 'StringTable':
+        """Tabela a partir de {string: código}, com códigos 0..n-1 na ordem de inserção"""
+        encoded = [value.encode('utf-8') for value in codes]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(blob, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def get(self, code: int) -> str:
+        return self.blob[self.offsets[code]:self.offsets[code + 1]].tobytes().decode('utf-8')
+
+    @property
+    def nbytes(self) -> int:
+        return self.blob.nbytes + self.offsets.nbytes
+
+
+class ResellerSnapshot:
+    """
+    Cópia colunar, só leitura, das revendas ativas com coordenadas (caminho quente da busca)
+
+    Coordenadas ficam em arrays float64, prioridade e flags em arrays de inteiros e os campos
+    de exibição como códigos int32 de uma StringTable compartilhada. A linha de uma revenda só
+    é materializada em dict para os resultados devolvidos. `keys` guarda o _id (como string) de
+    cada linha para aplicar alterações incrementais.
+    """
+
+    def __init__(self, keys: np.ndarray, lats: np.ndarray, lngs: np.ndarray, priority: np.ndarray,
+                 data_enriched: np.ndarray, columns: Dict[str, np.ndarray], strings: StringTable,
+                 appended_strings: int = 0):
+        self.keys = keys
+        self.lats = lats
+        self.lngs = lngs
+        self.priority = priority
+        self.data_enriched = data_enriched
+        self.columns = columns
+        self.strings = strings
+        # Strings acrescentadas por apply() desde a última construção (parte pode não ter mais uso)
+        self.appended_strings = appended_strings
+
+    @classmethod
+    def empty(cls) -> 'ResellerSnapshot':
+        return cls.build([])
+
+    @classmethod
+    def build(cls, entries: Iterable[Dict]) -> 'ResellerSnapshot':
+        """
+        Constrói o snapshot a partir de entradas (ver entry_from_document)
+        """
+        codes: Dict[str, int] = {}
+        field_codes: Dict[str, List[int]] = {field: [] for field in RESPONSE_FIELDS}
+        keys, lats, lngs, priority, data_enriched = [], [], [], [], []
+
+        for entry in entries:
+            keys.append(entry['key'])
+            for field in RESPONSE_FIELDS:
+                value = entry.get(field) or ''
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(codes)
+                field_codes[field].append(code)
+            lats.append(entry['lat'])
+            lngs.append(entry['lng'])
+            priority.append(entry.get('priority') or 0)
+            data_enriched.append(1 if entry.get('data_enriched') else 0)
+
+        return cls(
+            keys=np.array(keys, dtype=np.str_),
+            lats=np.array(lats, dtype=np.float64),
+            lngs=np.array(lngs, dtype=np.float64),
+            priority=np.array(priority, dtype=np.int32),
+            data_enriched=np.array(data_enriched, dtype=np.int8),
+            columns={field: np.array(values, dtype=np.int32) for field, values in field_codes.items()},
+            strings=StringTable.from_codes(codes)
+        )
+
+    def __len__(self) -> int:
+        return len(self.lats)
+
+    def apply(self, changes: Dict[str, Optional[Dict]]) -> 'ResellerSnapshot':
+        """
+        Novo snapshot com as alterações aplicadas (este não é modificado)
+
+        Args:
+            changes: {_id: entrada} - entrada None remove a revenda; as demais são inseridas ou
+                substituídas
+
+        As strings das linhas novas são acrescentadas ao fim da tabela; quando as acrescentadas
+        passam da metade da tabela, o snapshot é reconstruído para descartar as sem uso.
+        """
+        if not changes:
+            return self
+
+        keep = ~np.isin(self.keys, np.array(list(changes), dtype=np.str_))
+        added = ResellerSnapshot.build(entry for entry in changes.values() if entry is not None)
+        shift = len(self.strings)
+
+        snapshot = ResellerSnapshot(
+            keys=np.concatenate([self.keys[keep], added.keys]),
+            lats=np.concatenate([self.lats[keep], added.lats]),
+            lngs=np.concatenate([self.lngs[keep], added.lngs]),
+            priority=np.concatenate([self.priority[keep], added.priority]),
+            data_enriched=np.concatenate([self.data_enriched[keep], added.data_enriched]),
+            columns={
+                field: np.concatenate([codes[keep], added.columns[field] + shift])
+                for field, codes in self.columns.items()
+            },
+            strings=self.strings.concat(added.strings),
+            appended_strings=self.appended_strings + len(added.strings)
+        )
+
+        if snapshot.appended_strings > len(snapshot.strings) // 2:
+            snapshot = ResellerSnapshot.build(snapshot.entries())
+        return snapshot
+
+    def entries(self) -> Iterator[Dict]:
+        """Reconstrói as entradas (usado para compactar a tabela de strings)"""
+        for position in range(len(self)):
+            entry = self.row(position)
+            entry.update({
+                'key': str(self.keys[position]),
+                'lat': float(self.lats[position]),
+                'lng': float(self.lngs[position]),
+                'priority': int(self.priority[position])
+            })
+            yield entry
+
+    def row(self, position: int) -> Dict:
+        """Campos de exibição da revenda na posição (dict pronto para ResellerResponse)"""
+        row = {field: self.strings.get(self.columns[field][position]) for field in RESPONSE_FIELDS}
+        row['data_enriched'] = bool(self.data_enriched[position])
+        return row
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.keys, self.lats, self.lngs, self.priority, self.data_enriched, *self.columns.values())
+        return sum(array.nbytes for array in arrays) + self.strings.nbytes
@@ -0,0 +1,40 @@
+import json
+import hashlib
+from datetime import datetime
+from typing import Dict
+from pymongo import UpdateOne
+
+# Campos vindos do CSV: compõem o hash da linha e são os únicos que o upsert incremental sobrescreve
+SOURCE_FIELDS = (
+    'name', 'cnpj', 'address', 'neighborhood', 'city', 'state', 'cep', 'phone', 'whatsapp',
+    'active', 'service_radius_km', 'priority', 'serves_business', 'serves_residential',
+    'preferred_channel', 'coordinates'
+)
+
+
+def compute_source_hash(reseller_data: Dict, fields: tuple = SOURCE_FIELDS) -> str:
+    """Hash estável do conteúdo de origem de uma revenda"""
+    source = {field: reseller_data.get(field) for field in fields}
+    return hashlib.sha1(json.dumps(source, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def build_upsert_operation(document: Dict, fields: tuple = SOURCE_FIELDS) -> UpdateOne:
+    """
+    Upsert por CNPJ que só sobrescreve campos com valor na origem
+
+    Valores vazios ficam no $setOnInsert, preservando dados já enriquecidos de revendas existentes.
+    """
+    set_fields = {
+        field: document[field] for field in fields
+        if document.get(field) not in ('', None)
+    }
+    if set_fields.get('coordinates'):
+        set_fields['location'] = document['location']
+        set_fields['geocoding_source'] = document['geocoding_source']
+        set_fields['data_enriched'] = True
+    set_fields['source_hash'] = document['source_hash']
+    set_fields['updated_at'] = datetime.utcnow()
+
+    insert_only = {field: value for field, value in document.items() if field not in set_fields}
+
+    return UpdateOne({"cnpj": document['cnpj']}, {"$set": set_fields, "$setOnInsert": insert_only}, upsert=True)
@@ -0,0 +1,123 @@
+import os
+import random
+import asyncio
+import logging
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional
+import httpx
+from services.rate_limiter import rate_limiters
+
+logger = logging.getLogger(__name__)
+
+# Respostas transitórias que valem nova tentativa
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Segundos indicados pelo cabeçalho Retry-After (número de segundos ou data HTTP)"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryOutcome:
+    """Resultado de uma chamada com retry: última resposta (se houver) e se terminou por throttling"""
+
+    def __init__(self, response: Optional[httpx.Response] = None, throttled: bool = False, error: Optional[str] = None, attempts: int = 0):
+        self.response = response
+        self.throttled = throttled
+        self.error = error
+        self.attempts = attempts
+
+
+class RetryPolicy:
+    """
+    Novas tentativas com backoff exponencial e jitter para provedores externos
+
+    Respeita o Retry-After das respostas 429/503 e um prazo total por chamada: uma tentativa
+    que não caberia no prazo não é feita.
+    """
+
+    def __init__(self, max_attempts: int = None, base_delay: float = None, max_delay: float = None, deadline: float = None):
+        self.max_attempts = max_attempts or int(os.environ.get('PROVIDER_RETRY_MAX_ATTEMPTS', 4))
+        self.base_delay = base_delay or float(os.environ.get('PROVIDER_RETRY_BASE_DELAY', 0.5))
+        self.max_delay = max_delay or float(os.environ.get('PROVIDER_RETRY_MAX_DELAY', 8.0))
+        self.deadline = deadline or float(os.environ.get('PROVIDER_CALL_DEADLINE', 20.0))
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Espera antes da próxima tentativa ("full jitter"), nunca menor que o Retry-After"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    async def send(self, provider: str, request: Callable[[float], Awaitable[httpx.Response]], timeout: float) -> RetryOutcome:
+        """
+        Executa `request(timeout)` com novas tentativas em 429/5xx e falhas de rede
+
+        Cada tentativa passa pelo rate limiter do provedor; um 429 também pausa o provedor
+        pelo Retry-After para os demais chamadores.
+
+        Returns:
+            RetryOutcome com a resposta final (não transitória) ou o motivo da desistência
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        outcome = RetryOutcome()
+
+        for attempt in range(self.max_attempts):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+
+            try:
+                await asyncio.wait_for(rate_limiters.acquire(provider), remaining)
+            except asyncio.TimeoutError:
+                outcome.throttled = True
+                outcome.error = 'prazo esgotado aguardando o rate limiter'
+                break
+
+            outcome.attempts = attempt + 1
+            retry_after = None
+            try:
+                response = await request(min(timeout, max(deadline - loop.time(), 0.1)))
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                outcome.response = None
+                outcome.throttled = False
+                outcome.error = f"{type(e).__name__}: {str(e) or 'falha de rede'}"
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    return RetryOutcome(response=response, attempts=attempt + 1)
+
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                outcome.response = response
+                outcome.throttled = response.status_code == 429
+                outcome.error = f"HTTP {response.status_code}"
+
+                if outcome.throttled:
+                    rate_limiters.pause(provider, retry_after if retry_after is not None else 1.0)
+
+            if attempt + 1 >= self.max_attempts:
+                break
+
+            delay = self.backoff(attempt, retry_after)
+            if loop.time() + delay >= deadline:
+                break
+
+            logger.warning(f"🔁 {provider}: {outcome.error}, nova tentativa em {delay:.1f}s ({attempt + 1}/{self.max_attempts})")
+            await asyncio.sleep(delay)
+
+        logger.warning(f"{provider}: desistindo após {outcome.attempts} tentativa(s) ({outcome.error})")
+        return outcome
+
+# Política padrão compartilhada pelos serviços
+default_retry_policy = RetryPolicy()
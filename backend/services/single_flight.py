@@ -0,0 +1,46 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """
+    Agrupa chamadas idênticas simultâneas (single-flight)
+
+    Enquanto a consulta de uma chave está em andamento, novos chamadores com a mesma chave
+    aguardam o mesmo resultado em vez de disparar outra requisição ao provedor.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Executa `func` uma única vez por chave entre os chamadores simultâneos
+
+        O cancelamento de um chamador não cancela a consulta compartilhada pelos demais.
+        """
+        self.calls += 1
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _, key=key: self._in_flight.pop(key, None))
+        else:
+            self.shared += 1
+            logger.debug(f"🔗 {self.name}: aguardando consulta em andamento para {key}")
+
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict:
+        return {
+            'in_flight': len(self._in_flight),
+            'calls': self.calls,
+            'shared': self.shared
+        }
@@ -0,0 +1,127 @@
+import os
+import json
+import uuid
+import shutil
+import logging
+import numpy as np
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from services.reseller_snapshot import ResellerSnapshot, StringTable, RESPONSE_FIELDS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_DIR = Path(__file__).parent.parent / 'data' / 'index_snapshot'
+
+# Versão do formato em disco: snapshots de outra versão são ignorados (recarga da coleção)
+SNAPSHOT_FORMAT_VERSION = 1
+
+# Arrays gravados (um .npy cada) além das colunas de exibição col_<campo>.npy
+_ARRAY_NAMES = ('keys', 'lats', 'lngs', 'priority', 'data_enriched', 'strings_blob', 'strings_offsets')
+
+
+class SnapshotStore:
+    """
+    Snapshot versionado do índice de busca em disco, aberto com np.load(mmap_mode='r')
+
+    Cada versão fica num diretório próprio (arrays .npy + manifest.json) e o arquivo CURRENT
+    aponta para a mais recente; a troca é um os.replace, então leitores nunca veem uma versão
+    pela metade. Workers do mesmo host compartilham as páginas dos arquivos no page cache.
+    """
+
+    def __init__(self, directory: Path = None, keep_versions: int = None):
+        self.directory = Path(directory or os.environ.get('INDEX_SNAPSHOT_DIR') or DEFAULT_SNAPSHOT_DIR)
+        self.keep_versions = keep_versions or int(os.environ.get('INDEX_SNAPSHOT_KEEP_VERSIONS', 2))
+
+    @property
+    def current_path(self) -> Path:
+        return self.directory / 'CURRENT'
+
+    def save(self, snapshot: ResellerSnapshot, watermark: datetime) -> Path:
+        """Grava uma nova versão e a torna a atual"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        version = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        staging = self.directory / f".{version}.tmp"
+        staging.mkdir()
+
+        arrays = {
+            'keys': snapshot.keys,
+            'lats': snapshot.lats,
+            'lngs': snapshot.lngs,
+            'priority': snapshot.priority,
+            'data_enriched': snapshot.data_enriched,
+            'strings_blob': snapshot.strings.blob,
+            'strings_offsets': snapshot.strings.offsets,
+            **{f"col_{field}": codes for field, codes in snapshot.columns.items()}
+        }
+        for name, array in arrays.items():
+            np.save(staging / f"{name}.npy", np.ascontiguousarray(array), allow_pickle=False)
+
+        manifest = {
+            'format_version': SNAPSHOT_FORMAT_VERSION,
+            'created_at': datetime.utcnow().isoformat(),
+            'watermark': watermark.isoformat(),
+            'count': len(snapshot)
+        }
+        (staging / 'manifest.json').write_text(json.dumps(manifest))
+
+        staging.rename(self.directory / version)
+        pointer = self.directory / f".CURRENT.{version}.tmp"
+        pointer.write_text(version)
+        os.replace(pointer, self.current_path)
+
+        self._prune(version)
+        logger.info(f"💾 Snapshot do índice gravado: {version} ({len(snapshot)} revendas)")
+        return self.directory / version
+
+    def load(self) -> Optional[Tuple[ResellerSnapshot, Dict]]:
+        """
+        Abre a versão atual mapeada em memória
+
+        Returns:
+            (snapshot, manifest) - manifest['watermark'] como datetime - ou None quando não há
+            snapshot utilizável
+        """
+        try:
+            version = self.current_path.read_text().strip()
+        except FileNotFoundError:
+            return None
+
+        path = self.directory / version
+        try:
+            manifest = json.loads((path / 'manifest.json').read_text())
+            if manifest.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+                logger.info(f"Snapshot {version} em formato antigo, ignorado")
+                return None
+
+            arrays = {name: np.load(path / f"{name}.npy", mmap_mode='r', allow_pickle=False) for name in _ARRAY_NAMES}
+            columns = {field: np.load(path / f"col_{field}.npy", mmap_mode='r', allow_pickle=False) for field in RESPONSE_FIELDS}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Snapshot {version} ilegível, ignorado: {str(e)}")
+            return None
+
+        snapshot = ResellerSnapshot(
+            keys=arrays['keys'],
+            lats=arrays['lats'],
+            lngs=arrays['lngs'],
+            priority=arrays['priority'],
+            data_enriched=arrays['data_enriched'],
+            columns=columns,
+            strings=StringTable(arrays['strings_blob'], arrays['strings_offsets'])
+        )
+        if len(snapshot) != manifest['count']:
+            logger.warning(f"Snapshot {version} incompleto, ignorado")
+            return None
+
+        manifest['watermark'] = datetime.fromisoformat(manifest['watermark'])
+        return snapshot, manifest
+
+    def _prune(self, current: str):
+        """Remove versões antigas (mantém as keep_versions mais recentes) e sobras de gravações"""
+        versions = sorted(
+            (entry for entry in self.directory.iterdir() if entry.is_dir() and not entry.name.startswith('.')),
+            key=lambda entry: entry.name
+        )
+        for entry in versions[:-self.keep_versions]:
+            if entry.name != current:
+                shutil.rmtree(entry, ignore_errors=True)
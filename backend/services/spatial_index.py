@@ -0,0 +1,120 @@
+import math
+import logging
+import numpy as np
+from typing import List, Dict, Tuple, Optional
+from services.distance_service import DistanceService, KM_PER_DEGREE
+from services.reseller_snapshot import ResellerSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+class ResellerSpatialIndex:
+    """Índice espacial em memória (grade regular de lat/lng) sobre um ResellerSnapshot"""
+
+    def __init__(self, cell_size_deg: float = 0.25):
+        self.cell_size = cell_size_deg
+        self.cells: Dict[Tuple[int, int], np.ndarray] = {}
+        self.snapshot = ResellerSnapshot.empty()
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self.snapshot)
+
+    @property
+    def lats(self) -> np.ndarray:
+        return self.snapshot.lats
+
+    @property
+    def lngs(self) -> np.ndarray:
+        return self.snapshot.lngs
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (int(math.floor(lat / self.cell_size)), int(math.floor(lng / self.cell_size)))
+
+    def build(self, snapshot: ResellerSnapshot) -> 'ResellerSpatialIndex':
+        """
+        Constrói a grade sobre as coordenadas do snapshot
+        """
+        self.snapshot = snapshot
+
+        # Agrupa as posições por célula da grade (ordena por célula e corta nos limites)
+        rows = np.floor(self.lats / self.cell_size).astype(np.int64)
+        cols = np.floor(self.lngs / self.cell_size).astype(np.int64)
+        order = np.lexsort((cols, rows))
+        boundaries = np.flatnonzero((np.diff(rows[order]) != 0) | (np.diff(cols[order]) != 0)) + 1
+        starts = np.concatenate([[0], boundaries]) if len(order) else boundaries
+        self.cells = {
+            (row, col): positions
+            for row, col, positions in zip(rows[order][starts].tolist(), cols[order][starts].tolist(),
+                                           np.split(order, boundaries))
+        }
+
+        self.loaded = True
+        logger.info(
+            f"🧭 Índice espacial construído: {len(snapshot)} revendas em {len(self.cells)} células "
+            f"({snapshot.nbytes / 1024:.0f} KiB)"
+        )
+        return self
+
+    def _candidates(self, lat: float, lng: float, radius_km: float) -> np.ndarray:
+        """Posições das revendas nas células que intersectam o retângulo envolvente do raio"""
+        min_lat, max_lat, min_lng, max_lng = DistanceService.bounding_box(lat, lng, radius_km)
+        min_row, min_col = self._cell(min_lat, min_lng)
+        max_row, max_col = self._cell(max_lat, max_lng)
+
+        # Quando o retângulo cobre mais células que as ocupadas, percorre as ocupadas
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self.cells):
+            chunks = [positions for (row, col), positions in self.cells.items()
+                      if min_row <= row <= max_row and min_col <= col <= max_col]
+        else:
+            chunks = [self.cells[(row, col)]
+                      for row in range(min_row, max_row + 1)
+                      for col in range(min_col, max_col + 1)
+                      if (row, col) in self.cells]
+
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+
+    def _within_radius(self, lat: float, lng: float, radius_km: float, k: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (posições no snapshot, distâncias) das revendas dentro do raio, da mais próxima à mais distante
+
+        Com k, só as k mais próximas (seleção parcial em vez de ordenar todas as do raio).
+        """
+        candidates = self._candidates(lat, lng, radius_km)
+        if not len(candidates):
+            return candidates, np.empty(0, dtype=np.float64)
+
+        positions, distances = DistanceService.distances_within(
+            lat, lng, self.lats[candidates], self.lngs[candidates], radius_km
+        )
+        order = DistanceService.nearest_order(distances, k)
+        return candidates[positions[order]], distances[order]
+
+    def _rows(self, positions: np.ndarray, distances: np.ndarray) -> List[Tuple[float, Dict]]:
+        """Materializa (distância, revenda) só para as posições pedidas"""
+        return [(round(distance, 1), self.snapshot.row(position))
+                for position, distance in zip(positions.tolist(), distances.tolist())]
+
+    def query_radius(self, lat: float, lng: float, radius_km: float) -> List[Tuple[float, Dict]]:
+        """
+        Retorna (distância, revenda) de todas as revendas dentro do raio, da mais próxima à mais distante
+        """
+        return self._rows(*self._within_radius(lat, lng, radius_km))
+
+    def query_nearest(self, lat: float, lng: float, k: int, max_distance: Optional[float] = None) -> List[Tuple[float, Dict]]:
+        """
+        Retorna as k revendas mais próximas, opcionalmente limitadas a max_distance km
+        """
+        if k <= 0 or not len(self.snapshot):
+            return []
+
+        if max_distance is not None:
+            return self._rows(*self._within_radius(lat, lng, max_distance, k))
+
+        # Sem raio: dobra o raio até encontrar k revendas (ou cobrir o globo)
+        radius_km = self.cell_size * KM_PER_DEGREE
+        while True:
+            positions, distances = self._within_radius(lat, lng, radius_km, k)
+            if len(positions) >= k or radius_km >= 20040.0:
+                return self._rows(positions, distances)
+            radius_km *= 2
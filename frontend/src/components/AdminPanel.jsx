@@ -15,7 +15,8 @@ import {
   RefreshCw,
   CheckCircle,
   AlertCircle,
-  TrendingUp
+  TrendingUp,
+  XCircle
 } from 'lucide-react';
 import axios from 'axios';
 import { toast } from 'sonner';
@@ -23,10 +24,66 @@ import { toast } from 'sonner';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+const JOB_POLL_INTERVAL = 2000;
+const ACTIVE_JOB_STATUSES = ['queued', 'running'];
+
+const isJobActive = (job) => Boolean(job && ACTIVE_JOB_STATUSES.includes(job.status));
+
+const formatEta = (seconds) => {
+  if (seconds === null || seconds === undefined) return '—';
+  if (seconds < 60) return `${Math.round(seconds)}s`;
+  const minutes = Math.floor(seconds / 60);
+  return `${minutes}min ${Math.round(seconds % 60)}s`;
+};
+
+const JobProgress = ({ job, title, onCancel }) => {
+  const { progress = {} } = job;
+  const percentage = progress.total ? Math.min(100, Math.round((progress.processed / progress.total) * 100)) : null;
+
+  return (
+    <div className="bg-gradient-to-r from-blue-50 to-purple-50 border border-blue-200 rounded-lg p-4 space-y-3">
+      <div className="flex items-center justify-between">
+        <div className="flex items-center">
+          <RefreshCw className="h-5 w-5 text-blue-600 mr-2 animate-spin" />
+          <p className="text-blue-900 font-medium">
+            {title} {job.status === 'queued' ? '(na fila)' : 'em progresso'}
+          </p>
+        </div>
+        <Button onClick={onCancel} variant="outline" size="sm">
+          <XCircle className="h-4 w-4 mr-2" />
+          Cancelar
+        </Button>
+      </div>
+
+      {percentage !== null && (
+        <div className="w-full bg-blue-100 rounded-full h-2">
+          <div className="bg-blue-600 h-2 rounded-full transition-all" style={{ width: `${percentage}%` }} />
+        </div>
+      )}
+
+      <div className="grid grid-cols-2 md:grid-cols-5 gap-2 text-sm text-blue-800">
+        <span>Processadas: {progress.processed?.toLocaleString() ?? 0}{progress.total ? ` / ${progress.total.toLocaleString()}` : ''}</span>
+        {job.type === 'import' ? (
+          <span>Importadas: {(progress.imported ?? 0).toLocaleString()}</span>
+        ) : (
+          <span>Enriquecidas: {(progress.enriched ?? 0).toLocaleString()}</span>
+        )}
+        <span>Falhas: {progress.failed?.toLocaleString() ?? 0}</span>
+        <span>Taxa: {job.rate_per_sec}/s</span>
+        <span>ETA: {formatEta(job.eta_seconds)}</span>
+      </div>
+    </div>
+  );
+};
+
 export const AdminPanel = () => {
   const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState(false);
-  const [enrichmentRunning, setEnrichmentRunning] = useState(false);
+  // Tarefas em segundo plano por tipo ('import', 'smart_enrich')
+  const [jobs, setJobs] = useState({});
+
+  const importRunning = isJobActive(jobs.import);
+  const enrichmentRunning = isJobActive(jobs.smart_enrich);
   
   // Estados para testes de API
   const [cnpjTest, setCnpjTest] = useState('09443646000118');
@@ -49,45 +106,66 @@ export const AdminPanel = () => {
     }
   };
 
+  const startJob = async (endpoint, kind) => {
+    const response = await axios.post(`${API}${endpoint}`);
+    if (response.data.success) {
+      setJobs((current) => ({ ...current, [kind]: response.data.data }));
+    }
+    return response.data;
+  };
+
+  const handleJobFinished = (job) => {
+    if (job.status === 'completed') {
+      if (job.type === 'import') {
+        toast.success(`✅ ${job.result?.total_imported ?? 0} revendas importadas com dados otimizados!`);
+      } else {
+        toast.success(`✅ ${job.result?.total_enriched ?? 0} revendas enriquecidas inteligentemente!`);
+      }
+    } else if (job.status === 'cancelled') {
+      toast.info('Tarefa cancelada');
+    } else {
+      toast.error('Erro na tarefa: ' + job.error);
+    }
+    fetchStats();
+  };
+
+  const handleCancelJob = async (job) => {
+    try {
+      await axios.post(`${API}/data/jobs/${job.id}/cancel`);
+      toast.info('Cancelamento solicitado');
+    } catch (error) {
+      console.error('Erro ao cancelar tarefa:', error);
+      toast.error('Erro ao cancelar tarefa');
+    }
+  };
+
   const handleImportOptimized = async () => {
     try {
-      setLoading(true);
       toast.info('🚀 Iniciando importação otimizada...');
       
-      const response = await axios.post(`${API}/data/import-optimized`);
+      const data = await startJob('/data/import-optimized', 'import');
       
-      if (response.data.success) {
-        toast.success(`✅ ${response.data.total_imported} revendas importadas com dados otimizados!`);
-        fetchStats();
-      } else {
-        toast.error('Erro na importação: ' + response.data.message);
+      if (!data.success) {
+        toast.error('Erro na importação: ' + data.message);
       }
     } catch (error) {
       console.error('Erro na importação otimizada:', error);
       toast.error('Erro na importação otimizada');
-    } finally {
-      setLoading(false);
     }
   };
 
   const handleSmartEnrich = async () => {
     try {
-      setEnrichmentRunning(true);
       toast.info('🧠 Iniciando enriquecimento inteligente... Processamento otimizado!');
       
-      const response = await axios.post(`${API}/data/smart-enrich`);
+      const data = await startJob('/data/smart-enrich', 'smart_enrich');
       
-      if (response.data.success) {
-        toast.success(`✅ ${response.data.total_enriched} revendas enriquecidas inteligentemente!`);
-        fetchStats();
-      } else {
-        toast.error('Erro no enriquecimento: ' + response.data.message);
+      if (!data.success) {
+        toast.error('Erro no enriquecimento: ' + data.message);
       }
     } catch (error) {
       console.error('Erro no enriquecimento inteligente:', error);
       toast.error('Erro no enriquecimento inteligente');
-    } finally {
-      setEnrichmentRunning(false);
     }
   };
 
@@ -135,14 +213,31 @@ export const AdminPanel = () => {
 
   useEffect(() => {
     fetchStats();
-    
-    // Atualiza estatísticas a cada 30 segundos quando enriquecimento está rodando
-    const interval = enrichmentRunning ? setInterval(fetchStats, 30000) : null;
-    
-    return () => {
-      if (interval) clearInterval(interval);
-    };
-  }, [enrichmentRunning]);
+  }, []);
+
+  // Acompanha o progresso das tarefas ativas pelo endpoint de status
+  useEffect(() => {
+    const activeJobs = Object.values(jobs).filter(isJobActive);
+    if (activeJobs.length === 0) return undefined;
+
+    const interval = setInterval(async () => {
+      for (const job of activeJobs) {
+        try {
+          const response = await axios.get(`${API}/data/jobs/${job.id}`);
+          const updated = response.data.data;
+          setJobs((current) => ({ ...current, [updated.type]: updated }));
+
+          if (!isJobActive(updated)) {
+            handleJobFinished(updated);
+          }
+        } catch (error) {
+          console.error('Erro ao consultar tarefa:', error);
+        }
+      }
+    }, JOB_POLL_INTERVAL);
+
+    return () => clearInterval(interval);
+  }, [jobs]);
 
   return (
     <div className="min-h-screen bg-gray-50">
@@ -254,15 +349,15 @@ export const AdminPanel = () => {
                       </p>
                       <Button 
                         onClick={handleImportOptimized}
-                        disabled={loading}
+                        disabled={loading || importRunning}
                         className="w-full bg-gradient-to-r from-blue-500 to-purple-600 hover:from-blue-600 hover:to-purple-700"
                       >
-                        {loading ? (
+                        {importRunning ? (
                           <RefreshCw className="h-4 w-4 mr-2 animate-spin" />
                         ) : (
                           <Database className="h-4 w-4 mr-2" />
                         )}
-                        Importar CSV Otimizado
+                        {importRunning ? 'Importando...' : 'Importar CSV Otimizado'}
                       </Button>
                     </div>
                   </div>
@@ -275,7 +370,7 @@ export const AdminPanel = () => {
                       </p>
                       <Button 
                         onClick={handleSmartEnrich}
-                        disabled={loading || enrichmentRunning}
+                        disabled={enrichmentRunning}
                         className="w-full bg-gradient-to-r from-green-500 to-emerald-600 hover:from-green-600 hover:to-emerald-700"
                         variant={enrichmentRunning ? "secondary" : "default"}
                       >
@@ -290,18 +385,20 @@ export const AdminPanel = () => {
                   </div>
                 </div>
 
+                {importRunning && (
+                  <JobProgress
+                    job={jobs.import}
+                    title="📊 Importação Otimizada"
+                    onCancel={() => handleCancelJob(jobs.import)}
+                  />
+                )}
+
                 {enrichmentRunning && (
-                  <div className="bg-gradient-to-r from-blue-50 to-purple-50 border border-blue-200 rounded-lg p-4">
-                    <div className="flex items-center">
-                      <RefreshCw className="h-5 w-5 text-blue-600 mr-2 animate-spin" />
-                      <div>
-                        <p className="text-blue-900 font-medium">🧠 Enriquecimento Inteligente em Progresso</p>
-                        <p className="text-blue-700 text-sm">
-                          Processamento otimizado com Google Maps • Priorização inteligente • Estatísticas atualizadas automaticamente
-                        </p>
-                      </div>
-                    </div>
-                  </div>
+                  <JobProgress
+                    job={jobs.smart_enrich}
+                    title="🧠 Enriquecimento Inteligente"
+                    onCancel={() => handleCancelJob(jobs.smart_enrich)}
+                  />
                 )}
               </CardContent>
             </Card>